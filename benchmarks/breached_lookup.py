@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Measures lookup latency of the offline breached password index.
+
+A synthetic corpus of random SHA-1 hashes is built in a temporary directory,
+then hashes known to be present and absent are looked up.
+
+Usage:
+    python benchmarks/breached_lookup.py [--hashes 2000000] [--lookups 100000]
+"""
+import os
+import sys
+import time
+import shutil
+import random
+import argparse
+import binascii
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from userware.hashindex import BreachedHashIndex  # noqa
+from userware.hashindex import build_index  # noqa
+
+
+def random_hex():
+    return binascii.hexlify(os.urandom(20)).decode('ascii').upper()
+
+
+def time_lookups(index, digests):
+    timings = []
+    for digest in digests:
+        start = time.time()
+        index.count(digest)
+        timings.append((time.time() - start) * 1e6)
+    timings.sort()
+    return timings
+
+
+def report(name, timings):
+    print('{:<10} mean {:>7.2f} us   p50 {:>7.2f} us   p99 {:>7.2f} us   max {:>8.2f} us'.format(
+        name, sum(timings) / len(timings), timings[len(timings) // 2],
+        timings[int(len(timings) * 0.99)], timings[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hashes', type=int, default=2000000)
+    parser.add_argument('--lookups', type=int, default=100000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='userware-bench-')
+    try:
+        digests = sorted(random_hex() for _ in range(args.hashes))
+        start = time.time()
+        build_index(((d, 1) for d in digests), directory)
+        print('built {} hashes in {:.1f}s'.format(args.hashes, time.time() - start))
+
+        index = BreachedHashIndex(directory)
+        present = random.sample(digests, min(args.lookups, len(digests)))
+        absent = [random_hex() for _ in range(args.lookups)]
+        del digests
+        report('present', time_lookups(index, present))
+        report('absent', time_lookups(index, absent))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Measures the cost of importing userware and of first settings access.
+
+Each measurement runs in a fresh interpreter so module caches do not skew the numbers.
+
+Usage:
+    python benchmarks/import_time.py [--runs 20]
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETUP = (
+    "import time\n"
+    "from django.conf import settings\n"
+    "settings.configure()\n"
+)
+
+CASES = [
+    ('import userware', "import userware"),
+    ('import userware.defaults', "import userware.defaults"),
+    ('import userware.conf', "import userware.conf"),
+    ('first setting access', "from userware.conf import settings as defs\n"
+                             "defs.USERWARE_RESERVED_USERNAMES"),
+]
+
+
+def time_case(statement, runs):
+    """
+    Returns the per-run timings (in ms) of `statement` executed in a fresh interpreter.
+    """
+    code = SETUP + (
+        "start = time.time()\n"
+        "{}\n"
+        "print((time.time() - start) * 1000)\n"
+    ).format(statement)
+    timings = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+        timings.append(float(output.decode('utf-8').strip()))
+    return sorted(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    print('{:<28} {:>10} {:>10}'.format('case', 'median ms', 'max ms'))
+    for name, statement in CASES:
+        timings = time_case(statement, args.runs)
+        print('{:<28} {:>10.3f} {:>10.3f}'.format(name, timings[len(timings) // 2], timings[-1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,9 +7,8 @@ from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 
 from .forms import UserCreationForm
 from .forms import UserChangeForm
-from . import defaults as defs
-
-User = get_user_model()
+from .export import export_response
+from .conf import settings as defs
 
 
 class UserAdmin(DjangoUserAdmin):
@@ -78,9 +77,19 @@ class UserAdmin(DjangoUserAdmin):
     search_fields = ('first_name', 'last_name', 'username', 'email', 'id',)
     ordering = ('username', 'email',)
     filter_horizontal = ('groups', 'user_permissions',)
+    actions = ['export_as_csv', 'export_as_jsonl']
+
+    def export_as_csv(self, request, queryset):
+        return export_response(queryset, 'csv')
+    export_as_csv.short_description = _("Export selected users as CSV")
+
+    def export_as_jsonl(self, request, queryset):
+        return export_response(queryset, 'jsonl')
+    export_as_jsonl.short_description = _("Export selected users as JSON lines")
 
 if defs.USERWARE_REGISTER_ADMIN:
     # Now Register the User
+    User = get_user_model()
     try:
         admin.site.unregister(User)
     except admin.site.AlreadyRegistered:
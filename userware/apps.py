@@ -9,3 +9,15 @@ class AppConfig(DjangoAppConfig):
     """
     label = name = 'userware'
     verbose_name = _("userware app")
+
+    def ready(self):
+        """
+        App is imported and ready, so bootstrap it.
+        """
+        from .receivers import latch_to_signals
+        latch_to_signals()
+
+        from .conf import settings as defs
+        if defs.USERWARE_LAST_LOGIN_COALESCE:
+            from . import lastlogin
+            lastlogin.enable()
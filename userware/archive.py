@@ -0,0 +1,141 @@
+"""
+Archival of disabled and dormant accounts out of the user table.
+
+Archived users are serialized into `ArchivedUser` in batches, then reduced to a tombstone
+(same primary key, so foreign keys stay intact, but no username, email or usable password)
+or, in `delete` mode, deleted from the user table. Only the user row and its group and
+permission links are archived, so `delete` mode skips users that anything else refers to.
+Either way, login and lookups by username or email never see them. `restore_user` puts them
+back as they were, unless their username or email has been taken since.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import router
+from django.db import transaction
+from django.db.models.deletion import Collector
+from django.db.models import Q
+from django.core import serializers
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from .conf import settings as defs
+from .models import ArchivedUser
+from .utils import ARCHIVED_USERNAME_PREFIX as TOMBSTONE_PREFIX
+
+log = logging.getLogger('userware.archive')
+
+
+def get_archivable_users(dormant_days=None):
+    """
+    Returns the disabled users, plus those who haven't logged in for `dormant_days` if given.
+    Staff, superusers and already archived users (tombstones) are left out.
+    """
+    query = Q(is_active=False)
+    if dormant_days:
+        cutoff = timezone.now() - timedelta(days=dormant_days)
+        query |= Q(last_login__lt=cutoff) | Q(last_login__isnull=True, date_joined__lt=cutoff)
+    users = get_user_model().objects.filter(query, is_staff=False, is_superuser=False)
+    return users.exclude(pk__in=ArchivedUser.objects.values('user_id'))
+
+
+def has_related_objects(user):
+    """
+    Returns True if deleting `user` would delete or update rows other than its own
+    and its group and permission links (which are archived with it).
+    """
+    links = set(field.remote_field.through for field in user._meta.many_to_many)
+    collector = Collector(using=router.db_for_write(type(user)))
+    collector.collect([user])
+    for model, instances in collector.data.items():
+        if model is not user._meta.concrete_model and model not in links and instances:
+            return True
+    for queryset in collector.fast_deletes:
+        if queryset.model not in links and queryset.exists():
+            return True
+    for updates in collector.field_updates.values():
+        if any(updates.values()):
+            return True
+    return False
+
+
+def make_tombstone(user):
+    user.username = '{}{}'.format(TOMBSTONE_PREFIX, user.pk)
+    user.email = ''
+    user.first_name = ''
+    user.last_name = ''
+    user.is_active = False
+    user.set_unusable_password()
+    user.save()
+
+
+def archive_batch(users, mode, reason=''):
+    """
+    Archives `users` in one transaction, returns the number of users archived.
+    """
+    with transaction.atomic():
+        if mode == ArchivedUser.MODE_DELETE:
+            related = [user for user in users if has_related_objects(user)]
+            for user in related:
+                log.warning('Not archiving user {}, other rows refer to it'.format(user.pk))
+            users = [user for user in users if user not in related]
+        ArchivedUser.objects.bulk_create([
+            ArchivedUser(user_id=user.pk, username=user.username, email=user.email, mode=mode,
+                         reason=reason, data=serializers.serialize('json', [user]))
+            for user in users
+        ])
+        if mode == ArchivedUser.MODE_TOMBSTONE:
+            for user in users:
+                make_tombstone(user)
+        else:
+            get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
+    return len(users)
+
+
+def archive_users(queryset, mode=None, reason='', batch_size=None):
+    """
+    Archives the users of `queryset`, one transaction per `batch_size` users, walking the
+    table by primary key. Returns the number of users archived.
+    """
+    mode = mode or defs.USERWARE_ARCHIVE_MODE
+    batch_size = batch_size or defs.USERWARE_ARCHIVE_BATCH_SIZE
+    queryset = queryset.order_by('pk')
+    total = 0
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        users = list(batch[:batch_size])
+        if not users:
+            return total
+        total += archive_batch(users, mode, reason)
+        last_pk = users[-1].pk
+
+
+def get_restore_conflicts(archived):
+    """
+    Returns the fields ('username', 'email') of `archived` now taken by another user.
+    """
+    users = get_user_model().objects.exclude(pk=archived.user_id)
+    conflicts = []
+    if users.filter(username__iexact=archived.username).exists():
+        conflicts.append('username')
+    if archived.email and users.filter(email__iexact=archived.email).exists():
+        conflicts.append('email')
+    return conflicts
+
+
+def restore_user(user_id):
+    """
+    Puts an archived user back into the user table, returns the user.
+    Raises ValueError if its username or email now belongs to another user.
+    """
+    with transaction.atomic():
+        archived = ArchivedUser.objects.select_for_update().get(user_id=user_id)
+        conflicts = get_restore_conflicts(archived)
+        if conflicts:
+            raise ValueError("Cannot restore user {}, its {} is taken by another user.".format(
+                user_id, ' and '.join(conflicts)))
+        for obj in serializers.deserialize('json', archived.data):
+            obj.save()
+        archived.delete()
+    return get_user_model().objects.get(pk=user_id)
@@ -0,0 +1,84 @@
+import time
+import atexit
+import logging
+import threading
+
+from django.apps import apps
+from django.db import DatabaseError
+
+from .conf import settings as defs
+
+log = logging.getLogger('userware.audit')
+
+
+class AuditBuffer(object):
+    """
+    Collects audit records in memory and writes them with a single `bulk_create`
+    once `size` records are pending or `interval` seconds have passed since the last write.
+    Thresholds left as `None` follow the `USERWARE_AUDIT_*` settings.
+    """
+    def __init__(self, model_name, size=None, interval=None):
+        self.model_name = model_name
+        self._size = size
+        self._interval = interval
+        self.pending = []
+        self.last_flush = time.time()
+        self.lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self._size or defs.USERWARE_AUDIT_BUFFER_SIZE
+
+    @property
+    def interval(self):
+        return self._interval or defs.USERWARE_AUDIT_FLUSH_INTERVAL
+
+    @property
+    def model(self):
+        return apps.get_model('userware', self.model_name)
+
+    def add(self, **fields):
+        """
+        Queues a record, flushing the buffer if a threshold has been reached.
+        """
+        record = self.model(**fields)
+        with self.lock:
+            self.pending.append(record)
+            due = (len(self.pending) >= self.size or
+                   time.time() - self.last_flush >= self.interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all pending records in one batch.
+        """
+        with self.lock:
+            records, self.pending = self.pending, []
+            self.last_flush = time.time()
+        if not records:
+            return
+        try:
+            self.model.objects.bulk_create(records)
+        except DatabaseError:
+            log.exception('Failed to write {} audit record(s)'.format(len(records)))
+
+
+impersonation_buffer = AuditBuffer('ImpersonationLog')
+atexit.register(impersonation_buffer.flush)
+
+
+def log_impersonation(action, switched_username, user_id=None, method='', path='', ip_address=None):
+    """
+    Records an impersonation event by the staff user `user_id`.
+    """
+    if not defs.USERWARE_AUDIT_ENABLED:
+        return
+    impersonation_buffer.add(
+        staff_id=user_id,
+        switched_username=switched_username[:255],
+        action=action,
+        method=method[:10],
+        path=path[:255],
+        ip_address=ip_address or None,
+    )
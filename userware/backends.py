@@ -1,6 +1,7 @@
 from django.contrib.auth.backends import ModelBackend as DjangoModelBackend
 
 from . import utils as util
+from . import hashers
 
 
 class ModelBackend(DjangoModelBackend):
@@ -11,6 +12,6 @@ class ModelBackend(DjangoModelBackend):
         Handles if this is an email-based authentication.
         """
         user = util.get_user_by_username_or_email(username)
-        if user and user.check_password(password):
+        if user and hashers.check_password(user, password):
             return user
         return None
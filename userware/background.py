@@ -0,0 +1,36 @@
+"""
+Per process background threads.
+"""
+import os
+import threading
+
+
+class BackgroundThread(object):
+    """
+    Daemon thread running `run()`, (re)started on demand so it survives forking servers.
+    """
+    name = 'userware'
+
+    def __init__(self):
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def ensure_running(self):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.setup()
+                thread = threading.Thread(target=self.run, name=self.name)
+                thread.daemon = True
+                thread.start()
+                # set last, so no caller skips the lock before `setup()` is done
+                self.pid = os.getpid()
+
+    def setup(self):
+        """
+        Prepares the state of the thread, before it starts in this process.
+        """
+
+    def run(self):
+        raise NotImplementedError
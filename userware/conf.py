@@ -0,0 +1,55 @@
+"""
+Lazily evaluated userware settings.
+
+Usage:
+    from userware.conf import settings as defs
+    defs.USERWARE_PASSWORD_MIN_LENGTH
+"""
+from django.conf import settings as django_settings
+from django.core.signals import setting_changed
+
+from . import defaults
+
+
+class UserwareSettings(object):
+    """
+    Resolves a setting from the project settings, falling back to `defaults`,
+    on first access. Resolved values are memoized until `reload()` is called.
+    """
+    def __init__(self, defaults):
+        self._defaults = defaults
+        self._cache = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+        try:
+            default = getattr(self._defaults, name)
+        except AttributeError:
+            raise AttributeError("Invalid userware setting: '{}'".format(name))
+        value = getattr(django_settings, name, None)
+        if value is None:
+            value = default() if callable(default) else default
+        self._cache[name] = value
+        return value
+
+    def reload(self):
+        self._cache.clear()
+
+
+settings = UserwareSettings(defaults)
+
+
+def reload_settings(setting, **kwargs):
+    """
+    Drops memoized values when a setting is changed (e.g. `override_settings`).
+    """
+    if hasattr(defaults, setting):
+        settings.reload()
+
+
+setting_changed.connect(reload_settings, dispatch_uid='userware_reload_settings')
@@ -0,0 +1,165 @@
+"""
+Transaction-aware, batched dispatch of userware lifecycle events.
+
+Events are published once the surrounding transaction commits (and dropped if it rolls back).
+Within a request (see `UserEventMiddleware`) they are queued and delivered together once the
+response is ready, so a receiver subscribed with `batch=True` is called once per request with
+all of its events. Receivers subscribed with `threaded=True` are called off the request thread.
+
+    from userware import events
+
+    def sync_crm(batch):
+        ...
+
+    events.subscribe(sync_crm, events=[events.LOGIN, events.DISABLED], batch=True, threaded=True)
+"""
+import time
+import logging
+import threading
+
+from django.db import transaction
+from django.db import close_old_connections
+from django.contrib.auth import SESSION_KEY
+from django.utils.six.moves import queue
+
+from .background import BackgroundThread
+
+LOGIN = 'login'
+LOGOUT = 'logout'
+SWITCHED_ON = 'switched_on'
+SWITCHED_OFF = 'switched_off'
+PASSWORD_CHANGED = 'password_changed'
+DISABLED = 'disabled'
+DELETED = 'deleted'
+
+log = logging.getLogger('userware.events')
+
+
+def get_request_context(request):
+    """
+    Returns who made the request and where, as it stands now (before e.g. a logout).
+    """
+    session = getattr(request, 'session', {})
+    return {
+        'user_id': session.get(SESSION_KEY),
+        'method': request.method,
+        'path': request.path,
+        'ip_address': request.META.get('REMOTE_ADDR'),
+    }
+
+
+class Event(object):
+    """
+    A userware lifecycle event. If a `request` is part of the payload, its context
+    is captured at publish time in `context`.
+    """
+    def __init__(self, name, sender=None, **payload):
+        self.name = name
+        self.sender = sender
+        self.payload = payload
+        self.created_at = time.time()
+        request = payload.get('request')
+        self.context = get_request_context(request) if request is not None else {}
+
+    def __repr__(self):
+        return '<Event {} {!r}>'.format(self.name, self.sender)
+
+
+class _Worker(BackgroundThread):
+    """
+    Single daemon thread delivering events to threaded receivers.
+    """
+    name = 'userware-events'
+
+    def setup(self):
+        self.queue = queue.Queue()
+
+    def submit(self, job):
+        self.ensure_running()
+        self.queue.put(job)
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            # receivers may query; don't keep stale or broken connections on this thread.
+            close_old_connections()
+            try:
+                job()
+            finally:
+                close_old_connections()
+
+
+class EventBus(object):
+    """
+    Collects published events per request and delivers them to subscribed receivers.
+    """
+    def __init__(self):
+        self.receivers = []
+        self.local = threading.local()
+        self.worker = _Worker()
+
+    def subscribe(self, receiver, events=None, batch=False, threaded=False):
+        """
+        Subscribes `receiver` to the `events` names (all events if None). A batch receiver
+        is called with a list of events, any other receiver with one event at a time.
+        """
+        self.unsubscribe(receiver)
+        names = frozenset(events) if events is not None else None
+        self.receivers.append((receiver, names, batch, threaded))
+
+    def unsubscribe(self, receiver):
+        self.receivers = [entry for entry in self.receivers if entry[0] != receiver]
+
+    def publish(self, name, sender=None, **payload):
+        """
+        Publishes an event once the current transaction (if any) commits.
+        """
+        event = Event(name, sender, **payload)
+        on_commit = getattr(transaction, 'on_commit', None)
+        if on_commit is None:
+            self.enqueue(event)
+        else:
+            on_commit(lambda: self.enqueue(event))
+
+    def enqueue(self, event):
+        pending = getattr(self.local, 'pending', None)
+        if pending is None:
+            self.dispatch([event])
+        else:
+            pending.append(event)
+
+    def start_request(self, **kwargs):
+        # deliver what a previous request left behind if its finish_request was skipped
+        self.finish_request()
+        self.local.pending = []
+
+    def finish_request(self, **kwargs):
+        pending, self.local.pending = getattr(self.local, 'pending', None), None
+        if pending:
+            self.dispatch(pending)
+
+    def dispatch(self, events):
+        for receiver, names, batch, threaded in list(self.receivers):
+            selected = [event for event in events if names is None or event.name in names]
+            if not selected:
+                continue
+            if threaded:
+                self.worker.submit(lambda r=receiver, b=batch, s=selected: self.deliver(r, b, s))
+            else:
+                self.deliver(receiver, batch, selected)
+
+    def deliver(self, receiver, batch, events):
+        try:
+            if batch:
+                receiver(events)
+            else:
+                for event in events:
+                    receiver(event)
+        except Exception:
+            log.exception('Event receiver {!r} failed'.format(receiver))
+
+
+bus = EventBus()
+publish = bus.publish
+subscribe = bus.subscribe
+unsubscribe = bus.unsubscribe
@@ -0,0 +1,93 @@
+"""
+Streaming export of users as CSV or JSON lines.
+
+Rows are read in primary key order with keyset pagination (`pk > last_pk LIMIT n`),
+so memory stays flat however many users are exported and the first row is sent right away.
+"""
+import csv
+import json
+import itertools
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import six
+from django.utils.encoding import force_bytes
+from django.utils.encoding import force_text
+
+from .conf import settings as defs
+
+# cells starting with these are run as formulas by spreadsheet applications.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class Echo(object):
+    """
+    File-like object that returns what is written, for `csv.writer`.
+    """
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset, fields, chunk_size=None):
+    """
+    Yields `fields` of every object in `queryset` as tuples, one batch of `chunk_size` per query.
+    """
+    chunk_size = chunk_size or defs.USERWARE_EXPORT_CHUNK_SIZE
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(batch.values_list('pk', *fields)[:chunk_size])
+        for row in rows:
+            yield row[1:]
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+def escape_cell(value):
+    """
+    Returns `value` safe to open in a spreadsheet, text is encoded for the Python 2 csv module.
+    """
+    if isinstance(value, six.string_types) and value.startswith(FORMULA_PREFIXES):
+        value = "'" + value
+    if six.PY2 and isinstance(value, six.text_type):
+        value = force_bytes(value)
+    return value
+
+
+def iter_csv(rows, fields):
+    writer = csv.writer(Echo())
+    for row in itertools.chain([fields], rows):
+        yield force_text(writer.writerow([escape_cell(value) for value in row]))
+
+
+def iter_jsonl(rows, fields):
+    for row in rows:
+        yield force_text(json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder)) + u'\n'
+
+
+def iter_export(queryset, format='csv', fields=None, chunk_size=None):
+    """
+    Yields the (text) lines of an export of `queryset` in `format` (csv or jsonl).
+    """
+    fields = list(fields or defs.USERWARE_EXPORT_FIELDS)
+    rows = iter_rows(queryset, fields, chunk_size)
+    if format == 'jsonl':
+        return iter_jsonl(rows, fields)
+    return iter_csv(rows, fields)
+
+
+def export_response(queryset, format='csv', fields=None, chunk_size=None, filename='users'):
+    """
+    Returns a streaming download of an export of `queryset`.
+    """
+    response = StreamingHttpResponse(iter_export(queryset, format, fields, chunk_size),
+                                     content_type=CONTENT_TYPES[format])
+    response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(filename, format)
+    return response
@@ -11,12 +11,14 @@ from django.contrib.auth import get_user_model
 from django.utils.html import simple_email_re
 
 from toolware.utils.mixin import CleanSpacesMixin
-from auditware.utils import force_logout
 
 from . import utils as util
-from . import defaults as defs
-
-User = get_user_model()
+from . import hashers
+from . import replicas
+from . import validators
+from .conf import settings as defs
+from .idempotency import IdempotencyFormMixin
+from .models import ArchivedUser
 
 
 class UserCreationForm(DjangoUserCreationForm):
@@ -24,7 +26,10 @@ class UserCreationForm(DjangoUserCreationForm):
     A form to create a user based on a unique email and a verified password.
     """
     required_css_class = 'required_field'
-    pass_len = defs.USERWARE_PASSWORD_MIN_LENGTH
+
+    @property
+    def pass_len(self):
+        return defs.USERWARE_PASSWORD_MIN_LENGTH
 
     username = forms.RegexField(
         label=_("Username"),
@@ -42,6 +47,7 @@ class UserCreationForm(DjangoUserCreationForm):
 
     def __init__(self, *args, **kwargs):
         super(UserCreationForm, self).__init__(*args, **kwargs)
+        self.error_messages['duplicate_username'] = _("A user with that username already exists.")
         self.error_messages['duplicate_email'] = _("A user with that email already exists.")
         self.fields['email'].help_text = _("A valid email address")
         self.fields['password1'].help_text = _("Password must be minimum of %s characters." % self.pass_len)
@@ -49,26 +55,45 @@ class UserCreationForm(DjangoUserCreationForm):
 
     def clean_username(self):
         username = self.cleaned_data["username"]
+        if username.lower().startswith(util.ARCHIVED_USERNAME_PREFIX):
+            raise forms.ValidationError(self.error_messages['duplicate_username'])
         if username not in defs.USERWARE_RESERVED_USERNAMES and len(username) >= defs.USERWARE_USERNAME_MIN_LENGTH:
+            User = get_user_model()
             try:
-                User.objects.get(username__iexact=username)
+                replicas.get_user_manager().get(username__iexact=username)
             except User.DoesNotExist:
-                return username
+                # archived users keep their username, to be restorable
+                if not ArchivedUser.objects.filter(username__iexact=username).exists():
+                    return username
         raise forms.ValidationError(self.error_messages['duplicate_username'])
 
     def clean_email(self):
         email = self.cleaned_data["email"]
+        User = get_user_model()
         try:
-            User.objects.get(email__iexact=email)
+            replicas.get_user_manager().get(email__iexact=email)
         except User.DoesNotExist:
-            return email
+            if not ArchivedUser.objects.filter(email__iexact=email).exists():
+                return email
         raise forms.ValidationError(self.error_messages['duplicate_email'])
 
-    def clean_password2(self):
-        password2 = super(UserCreationForm, self).clean_password2()
-        if len(password2) < self.pass_len:
-            raise forms.ValidationError(_("Password too short! minimum length is ") + " [%d]." % self.pass_len)
-        return password2
+    def clean(self):
+        """
+        Validates the password once every field is cleaned, so it is compared
+        against the username and the email.
+        """
+        cleaned_data = super(UserCreationForm, self).clean()
+        password2 = cleaned_data.get('password2')
+        if password2 and not self.has_error('password2'):
+            user = self._meta.model(
+                username=cleaned_data.get('username'),
+                email=cleaned_data.get('email'),
+            )
+            try:
+                validators.validate_password(password2, user)
+            except forms.ValidationError as e:
+                self.add_error('password2', e)
+        return cleaned_data
 
 
 class UserChangeForm(DjangoUserChangeForm):
@@ -88,16 +113,18 @@ class UserChangeForm(DjangoUserChangeForm):
 
     def clean_username(self):
         username = self.cleaned_data["username"]
+        if username.lower().startswith(util.ARCHIVED_USERNAME_PREFIX):
+            raise forms.ValidationError(self.error_messages['duplicate_username'])
         if username not in defs.USERWARE_RESERVED_USERNAMES and len(username) >= defs.USERWARE_USERNAME_MIN_LENGTH:
-            users = User.objects.filter(username__iexact=username).exclude(id=self.instance.id)
-            if not users:
+            users = replicas.get_user_manager().filter(username__iexact=username).exclude(id=self.instance.id)
+            if not users and not ArchivedUser.objects.filter(username__iexact=username).exists():
                 return username
         raise forms.ValidationError(_("A user with that username already exists."))
 
     def clean_email(self):
         email = self.cleaned_data["email"]
-        users = User.objects.filter(email__iexact=email).exclude(id=self.instance.id)
-        if users:
+        users = replicas.get_user_manager().filter(email__iexact=email).exclude(id=self.instance.id)
+        if users or ArchivedUser.objects.filter(email__iexact=email).exists():
             raise forms.ValidationError(_("A user with that email already exists."))
         return email.lower()
 
@@ -117,7 +144,7 @@ class UserAuthenticationForm(DjangoAuthenticationForm):
         self.fields['username'].widget.attrs['autofocus'] = ''
 
 
-class UserPasswordResetForm(DjangoPasswordResetForm):
+class UserPasswordResetForm(IdempotencyFormMixin, DjangoPasswordResetForm):
     """
     Customized password reset form.
     """
@@ -175,12 +202,15 @@ class UserPasswordResetForm(DjangoPasswordResetForm):
         return self.cleaned_data
 
 
-class UserPasswordChangeForm(DjangoPasswordChangeForm):
+class UserPasswordChangeForm(IdempotencyFormMixin, DjangoPasswordChangeForm):
     """
     Customized password change form.
     """
     required_css_class = 'required_field'
-    pass_len = defs.USERWARE_PASSWORD_MIN_LENGTH
+
+    @property
+    def pass_len(self):
+        return defs.USERWARE_PASSWORD_MIN_LENGTH
 
     def __init__(self, *args, **kwargs):
         super(UserPasswordChangeForm, self).__init__(*args, **kwargs)
@@ -190,21 +220,46 @@ class UserPasswordChangeForm(DjangoPasswordChangeForm):
         self.fields['new_password1'].help_text = _("Password must be minimum of %s characters." % self.pass_len)
         self.fields['old_password'].widget.attrs['autofocus'] = ''
 
+    def clean_old_password(self):
+        """
+        The old password is verified in `clean()`, once the new password passed the cheap checks.
+        """
+        return self.cleaned_data["old_password"]
+
     def clean_new_password2(self):
         new_password2 = super(UserPasswordChangeForm, self).clean_new_password2()
-        if len(new_password2) < self.pass_len:
-            raise forms.ValidationError(_("Password too short! minimum length is ") + " [%d]." % self.pass_len)
-        if self.user.check_password(new_password2):
-            raise forms.ValidationError(_("New password is too similar to the old password. Please choose a different password."))
+        validators.validate_password(new_password2, self.user, max_cost=validators.COST_KDF - 1)
         return new_password2
 
+    def clean(self):
+        """
+        Runs the password hashing checks, only if every other check has passed.
+        """
+        cleaned_data = super(UserPasswordChangeForm, self).clean()
+        if self.errors:
+            return cleaned_data
+        if not hashers.check_password(self.user, cleaned_data['old_password']):
+            self.add_error('old_password', forms.ValidationError(
+                self.error_messages['password_incorrect'],
+                code='password_incorrect',
+            ))
+            return cleaned_data
+        try:
+            validators.validate_password(cleaned_data['new_password2'], self.user, min_cost=validators.COST_KDF)
+        except forms.ValidationError as e:
+            self.add_error('new_password2', e)
+        return cleaned_data
+
 
 class UserSetPasswordForm(DjangoSetPasswordForm):
     """
     Customized password reset form.
     """
     required_css_class = 'required_field'
-    pass_len = defs.USERWARE_PASSWORD_MIN_LENGTH
+
+    @property
+    def pass_len(self):
+        return defs.USERWARE_PASSWORD_MIN_LENGTH
 
     def __init__(self, user, *args, **kwargs):
         super(UserSetPasswordForm, self).__init__(user, *args, **kwargs)
@@ -214,15 +269,12 @@ class UserSetPasswordForm(DjangoSetPasswordForm):
 
     def clean_new_password2(self):
         new_password2 = super(UserSetPasswordForm, self).clean_new_password2()
-        if len(new_password2) < self.pass_len:
-            raise forms.ValidationError(_("Password too short! minimum length is ") + " [%d]." % self.pass_len)
-        if self.user.check_password(new_password2):
-            raise forms.ValidationError(_("New password is too similar to the old password. Please choose a different password."))
-        force_logout(self.user)
+        validators.validate_password(new_password2, self.user)
+        util.force_logout(self.user)
         return new_password2
 
 
-class UserDeletionForm(CleanSpacesMixin, forms.Form):
+class UserDeletionForm(CleanSpacesMixin, IdempotencyFormMixin, forms.Form):
     """
     Delete a user (account) form.
     """
@@ -252,12 +304,12 @@ class UserDeletionForm(CleanSpacesMixin, forms.Form):
 
     def clean_password(self):
         password = self.cleaned_data["password"]
-        if not self.user.check_password(password):
+        if not hashers.check_password(self.user, password):
             raise forms.ValidationError(_("Invalid password, please try again."))
         return password
 
 
-class UserDisableForm(CleanSpacesMixin, forms.Form):
+class UserDisableForm(CleanSpacesMixin, IdempotencyFormMixin, forms.Form):
     """
     Disable a user (account) form.
     """
@@ -275,7 +327,7 @@ class UserDisableForm(CleanSpacesMixin, forms.Form):
 
     def clean_password(self):
         password = self.cleaned_data["password"]
-        if not self.user.check_password(password):
+        if not hashers.check_password(self.user, password):
             raise forms.ValidationError(_("Invalid password, please try again."))
         return password
 
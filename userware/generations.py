@@ -0,0 +1,57 @@
+"""
+Per-user session generations, used to force logout stateless (signed cookie) sessions.
+
+The current generation lives in the database and is cached; bumping it invalidates
+every session stamped with an older generation.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+from .models import SessionGeneration
+from .conf import settings as defs
+
+SESSION_ENGINE = 'userware.sessions.signed_cookies'
+GENERATION_SESSION_KEY = '_userware_generation'
+
+
+def is_enabled():
+    """
+    Returns True if the userware signed cookie session engine is in use.
+    """
+    return settings.SESSION_ENGINE == SESSION_ENGINE
+
+
+def get_cache():
+    return caches[defs.USERWARE_SESSION_GENERATION_CACHE]
+
+
+def get_cache_key(user_id):
+    return 'userware:generation:{}'.format(user_id)
+
+
+def get_generation(user_id):
+    """
+    Returns the current session generation of a user.
+    """
+    cache = get_cache()
+    key = get_cache_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        generations = SessionGeneration.objects.filter(user_id=user_id).values_list('generation', flat=True)
+        generation = generations.first() or 0
+        cache.set(key, generation)
+    return generation
+
+
+def bump_generation(user_id):
+    """
+    Moves a user to a new session generation, invalidating all existing sessions.
+    Returns the new generation.
+    """
+    SessionGeneration.objects.get_or_create(user_id=user_id)
+    generations = SessionGeneration.objects.filter(user_id=user_id)
+    generations.update(generation=F('generation') + 1)
+    generation = generations.values_list('generation', flat=True).get()
+    get_cache().set(get_cache_key(user_id), generation)
+    return generation
@@ -0,0 +1,155 @@
+"""
+PBKDF2 wrapping of legacy SHA1 / MD5 password hashes, salted (`sha1$salt$...`) or not
+(`sha1$$...`, `md5$$...` or a bare MD5 digest).
+
+A wrapped hash is PBKDF2 applied to the legacy digest, so it can be computed offline without
+knowing the password (see `userware_upgrade_hashes`). On login it is recognized and replaced
+with a hash of the preferred hasher. To let every `check_password()` call understand them,
+add the wrapped hashers to `PASSWORD_HASHERS` (after the preferred one).
+
+    PASSWORD_HASHERS = [
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'userware.hashers.PBKDF2WrappedSHA1PasswordHasher',
+        'userware.hashers.PBKDF2WrappedMD5PasswordHasher',
+        'userware.hashers.PBKDF2WrappedUnsaltedSHA1PasswordHasher',
+        'userware.hashers.PBKDF2WrappedUnsaltedMD5PasswordHasher',
+        ...
+    ]
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Q
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.hashers import SHA1PasswordHasher
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.contrib.auth.hashers import UnsaltedSHA1PasswordHasher
+from django.contrib.auth.hashers import UnsaltedMD5PasswordHasher
+
+BARE_MD5_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class PBKDF2WrappedSHA1PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 of a salted SHA1 digest. The PBKDF2 salt is the legacy one.
+    """
+    algorithm = 'pbkdf2_wrapped_sha1'
+    legacy_hasher = SHA1PasswordHasher
+    legacy_prefix = 'sha1'
+    legacy_salted = True
+
+    def encode_legacy_hash(self, digest, salt, iterations=None):
+        return super(PBKDF2WrappedSHA1PasswordHasher, self).encode(digest, salt, iterations)
+
+    def get_legacy_digest(self, password, salt):
+        encoded = self.legacy_hasher().encode(password, salt if self.legacy_salted else '')
+        return encoded.rpartition('$')[2]
+
+    def encode(self, password, salt, iterations=None):
+        return self.encode_legacy_hash(self.get_legacy_digest(password, salt), salt, iterations)
+
+
+class PBKDF2WrappedMD5PasswordHasher(PBKDF2WrappedSHA1PasswordHasher):
+    algorithm = 'pbkdf2_wrapped_md5'
+    legacy_hasher = MD5PasswordHasher
+    legacy_prefix = 'md5'
+
+
+class PBKDF2WrappedUnsaltedSHA1PasswordHasher(PBKDF2WrappedSHA1PasswordHasher):
+    """
+    PBKDF2 of an unsalted SHA1 digest. The PBKDF2 salt is a new, random one.
+    """
+    algorithm = 'pbkdf2_wrapped_unsalted_sha1'
+    legacy_hasher = UnsaltedSHA1PasswordHasher
+    legacy_salted = False
+
+
+class PBKDF2WrappedUnsaltedMD5PasswordHasher(PBKDF2WrappedUnsaltedSHA1PasswordHasher):
+    algorithm = 'pbkdf2_wrapped_unsalted_md5'
+    legacy_hasher = UnsaltedMD5PasswordHasher
+    legacy_prefix = 'md5'
+
+
+WRAPPED_HASHERS = [
+    PBKDF2WrappedSHA1PasswordHasher,
+    PBKDF2WrappedMD5PasswordHasher,
+    PBKDF2WrappedUnsaltedSHA1PasswordHasher,
+    PBKDF2WrappedUnsaltedMD5PasswordHasher,
+]
+
+
+def parse_legacy_hash(encoded):
+    """
+    Returns `(wrapping hasher, salt, digest)` for a legacy `encoded` hash, or None.
+    """
+    if BARE_MD5_RE.match(encoded):
+        return PBKDF2WrappedUnsaltedMD5PasswordHasher(), '', encoded
+    try:
+        prefix, salt, digest = encoded.split('$', 2)
+    except ValueError:
+        return None
+    for hasher in WRAPPED_HASHERS:
+        if digest and hasher.legacy_prefix == prefix and hasher.legacy_salted == bool(salt):
+            return hasher(), salt, digest
+    return None
+
+
+def get_wrapped_hasher(encoded):
+    """
+    Returns the hasher of a wrapped `encoded` hash, or None.
+    """
+    algorithm = encoded.partition('$')[0]
+    for hasher in WRAPPED_HASHERS:
+        if hasher.algorithm == algorithm:
+            return hasher()
+    return None
+
+
+def wrap_hash(encoded):
+    """
+    Returns the wrapped version of a legacy `encoded` hash, or None if it is not a legacy hash.
+    """
+    legacy = parse_legacy_hash(encoded or '')
+    if legacy is None:
+        return None
+    hasher, salt, digest = legacy
+    return hasher.encode_legacy_hash(digest, salt or hasher.salt())
+
+
+def check_password(user, password):
+    """
+    Checks `password` against the user's hash, recognizing wrapped hashes even if their
+    hashers are not in `PASSWORD_HASHERS`. A matching wrapped hash is upgraded in place.
+    """
+    hasher = get_wrapped_hasher(user.password or '')
+    if hasher is None:
+        return user.check_password(password)
+    if password is None or not hasher.verify(password, user.password):
+        return False
+    user.set_password(password)
+    user.save(update_fields=['password'])
+    return True
+
+
+def get_legacy_filter():
+    query = Q(password__regex=BARE_MD5_RE.pattern)
+    for hasher in WRAPPED_HASHERS:
+        query |= Q(password__startswith=hasher.legacy_prefix + '$')
+    return query
+
+
+def upgrade_hashes(start, stop):
+    """
+    Wraps the legacy hashes of users with `start <= pk < stop` in one transaction.
+    A hash changed concurrently is left alone. Returns the number of hashes wrapped.
+    """
+    User = get_user_model()
+    upgraded = 0
+    with transaction.atomic():
+        rows = User.objects.filter(get_legacy_filter(), pk__gte=start, pk__lt=stop).values_list('pk', 'password')
+        for pk, encoded in rows:
+            wrapped = wrap_hash(encoded)
+            if wrapped is not None:
+                upgraded += User.objects.filter(pk=pk, password=encoded).update(password=wrapped)
+    return upgraded
@@ -0,0 +1,96 @@
+"""
+Local, offline index of breached password SHA-1 hashes (k-anonymity range style).
+
+The corpus is a directory of shards named after the first `prefix_length` hex characters
+of the hash (e.g. `5B.bin`). Each shard is a `SortedFile` whose records hold the rest of
+the binary digest followed by a big-endian uint32 breach count.
+
+This module does not depend on Django.
+"""
+import os
+import struct
+import hashlib
+import binascii
+import itertools
+
+from .sortedfile import open_sorted_file
+from .sortedfile import write_sorted_file
+
+SHA1_HEX_LENGTH = 40
+SHARD_SUFFIX = '.bin'
+COUNT = struct.Struct('>I')
+
+
+def sha1_hex(password):
+    """
+    Returns the uppercase SHA-1 hex digest of a unicode password.
+    """
+    return hashlib.sha1(password.encode('utf-8')).hexdigest().upper()
+
+
+class BreachedHashIndex(object):
+    """
+    Looks up SHA-1 hashes in a sharded corpus built with `build_index`.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._prefix_length = None
+
+    @property
+    def prefix_length(self):
+        # not cached while the directory is empty, so an index built later is picked up.
+        if self._prefix_length is None:
+            self._prefix_length = self._detect_prefix_length()
+        return self._prefix_length
+
+    def _detect_prefix_length(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(SHARD_SUFFIX):
+                return len(name) - len(SHARD_SUFFIX)
+        return None
+
+    def get_shard(self, prefix):
+        path = os.path.join(self.directory, prefix + SHARD_SUFFIX)
+        try:
+            return open_sorted_file(path)
+        except (IOError, OSError):
+            return None
+
+    def count(self, digest):
+        """
+        Returns how many times the hash `digest` (hex) was seen in breaches, 0 if never.
+        """
+        if not self.prefix_length:
+            return 0
+        digest = digest.upper()
+        shard = self.get_shard(digest[:self.prefix_length])
+        if shard is None:
+            return 0
+        record = shard.find(binascii.unhexlify(digest[self.prefix_length:]))
+        if record is None:
+            return 0
+        return COUNT.unpack(record[-COUNT.size:])[0]
+
+
+def build_index(entries, directory, prefix_length=2):
+    """
+    Writes a sharded corpus from `entries`, an iterable of `(sha1_hex, count)` in ascending
+    hash order, streaming each shard to disk. Returns the number of hashes written.
+    """
+    if prefix_length % 2 or not 0 < prefix_length < SHA1_HEX_LENGTH:
+        raise ValueError("prefix_length must be an even number of hex characters")
+    key_size = (SHA1_HEX_LENGTH - prefix_length) // 2
+    record_size = key_size + COUNT.size
+    total = 0
+    written = set()
+    for prefix, group in itertools.groupby(entries, key=lambda entry: entry[0][:prefix_length]):
+        if prefix in written:
+            raise ValueError("Entries are not sorted (prefix {} seen twice)".format(prefix))
+        written.add(prefix)
+        records = (
+            binascii.unhexlify(digest[prefix_length:]) + COUNT.pack(min(count, 0xFFFFFFFF))
+            for digest, count in group
+        )
+        path = os.path.join(directory, prefix + SHARD_SUFFIX)
+        total += write_sorted_file(path, records, record_size, key_size)
+    return total
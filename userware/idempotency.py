@@ -0,0 +1,130 @@
+"""
+Idempotency keys for account mutating POSTs.
+
+Each protected form carries a one-time token (`IdempotencyFormMixin`, or an `Idempotency-Key`
+header). The first POST with a token claims it in the cache; a duplicate of that POST
+(double click, client retry) waits for the first one to finish and replays its redirect,
+instead of hashing passwords, sending email or writing to the database again.
+Only redirects are remembered; any other outcome (e.g. a form error) releases the token.
+A POST reusing a token with different form data (e.g. resubmitted after going back and
+editing the form) is rejected with a 422 instead of being answered with the first redirect.
+"""
+import json
+import time
+import uuid
+import hashlib
+from functools import wraps
+
+from django import forms
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.http import HttpResponseRedirect
+from django.utils.encoding import force_bytes
+
+from .conf import settings as defs
+
+FIELD_NAME = 'idempotency_key'
+HEADER_NAME = 'HTTP_IDEMPOTENCY_KEY'
+POLL_INTERVAL = 0.1
+# fields that differ between submissions of the same form data
+IGNORED_FIELDS = (FIELD_NAME, 'csrfmiddlewaretoken')
+
+
+def make_key():
+    return uuid.uuid4().hex
+
+
+class IdempotencyFormMixin(forms.Form):
+    """
+    Adds a hidden, per rendered form, idempotency key.
+    """
+    idempotency_key = forms.CharField(widget=forms.HiddenInput, required=False,
+                                      max_length=64, initial=make_key)
+
+
+def get_cache():
+    return caches[defs.USERWARE_IDEMPOTENCY_CACHE]
+
+
+def get_cache_key(request, key):
+    """
+    Returns the cache key of an idempotency `key`, scoped to the requested path and user.
+    """
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated() else ''
+    scope = u'{}:{}:{}'.format(request.path, user_id, key)
+    return 'userware:idempotency:{}'.format(hashlib.sha256(force_bytes(scope)).hexdigest())
+
+
+def get_data_hash(request):
+    """
+    Returns a digest of the submitted form data, without the per submission fields.
+    """
+    data = sorted((name, values) for name, values in request.POST.lists() if name not in IGNORED_FIELDS)
+    return hashlib.sha256(force_bytes(json.dumps(data))).hexdigest()
+
+
+def replay(cache_key, data_hash):
+    """
+    Returns the response of the first request with this key, once it has one.
+    """
+    cache = get_cache()
+    deadline = time.time() + defs.USERWARE_IDEMPOTENCY_WAIT
+    result = cache.get(cache_key)
+    while result is not None and 'location' not in result and time.time() < deadline:
+        if result['data'] != data_hash:
+            break
+        time.sleep(POLL_INTERVAL)
+        result = cache.get(cache_key)
+    if result is not None and result['data'] != data_hash:
+        return HttpResponse("Idempotency key reused with different data.", status=422)
+    if result is None or 'location' not in result:
+        # still running, or released without a result.
+        return HttpResponse("Duplicate request, please retry.", status=409)
+    response = HttpResponseRedirect(result['location'])
+    response.status_code = result['status']
+    return response
+
+
+def run_once(request, view):
+    """
+    Calls `view()` unless the POST is a duplicate of one with the same idempotency key,
+    in which case the first response is replayed (or a 422 returned if its data differs).
+    """
+    key = request.POST.get(FIELD_NAME) or request.META.get(HEADER_NAME)
+    if request.method != 'POST' or not key:
+        return view()
+    cache = get_cache()
+    cache_key = get_cache_key(request, key)
+    data_hash = get_data_hash(request)
+    if not cache.add(cache_key, {'data': data_hash}, defs.USERWARE_IDEMPOTENCY_TTL):
+        return replay(cache_key, data_hash)
+    try:
+        response = view()
+    except Exception:
+        cache.delete(cache_key)
+        raise
+    if 300 <= response.status_code < 400 and response.has_header('Location'):
+        result = {'data': data_hash, 'status': response.status_code, 'location': response['Location']}
+        cache.set(cache_key, result, defs.USERWARE_IDEMPOTENCY_TTL)
+    else:
+        cache.delete(cache_key)
+    return response
+
+
+def idempotent(view_func):
+    """
+    View decorator, see `run_once`.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        return run_once(request, lambda: view_func(request, *args, **kwargs))
+    return wrapper
+
+
+class IdempotentMixin(object):
+    """
+    Class based view mixin, see `run_once`. List it after the access control mixins.
+    """
+    def post(self, request, *args, **kwargs):
+        return run_once(request, lambda: super(IdempotentMixin, self).post(request, *args, **kwargs))
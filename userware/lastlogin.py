@@ -0,0 +1,141 @@
+"""
+Coalesced `last_login` writes.
+
+Instead of an UPDATE of the user row on every login, login timestamps are buffered in a cache
+and written in batches, by `manage.py userware_flush_last_login` or a background thread.
+Buffered entries are numbered with a cache counter, so any process can flush them.
+Flushes are serialized with a cache lock; entries numbered but not yet written when a flush
+runs are retried by the next ones, until they would have expired. If the counter is lost
+(evicted, cache restarted) numbering starts over and the next flush rescans from the start.
+"""
+import os
+import time
+import logging
+
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.contrib.auth.signals import user_logged_in
+from django.db import close_old_connections
+from django.db.models import Case
+from django.db.models import DateTimeField
+from django.db.models import Value
+from django.db.models import When
+from django.utils import timezone
+
+from .background import BackgroundThread
+from .conf import settings as defs
+
+KEY_PREFIX = 'userware:last_login'
+SEQUENCE_KEY = KEY_PREFIX + ':sequence'
+FLUSHED_KEY = KEY_PREFIX + ':flushed'
+GAPS_KEY = KEY_PREFIX + ':gaps'
+LOCK_KEY = KEY_PREFIX + ':lock'
+LOCK_TIMEOUT = 300
+
+log = logging.getLogger('userware.lastlogin')
+
+
+def get_cache():
+    return caches[defs.USERWARE_LAST_LOGIN_CACHE]
+
+
+def get_entry_key(number):
+    return '{}:entry:{}'.format(KEY_PREFIX, number)
+
+
+def record_last_login(sender, user, **kwargs):
+    """
+    Buffers the login time of `user`, unless it logged in less than
+    `USERWARE_LAST_LOGIN_MIN_INTERVAL` seconds ago.
+    """
+    cache = get_cache()
+    interval = defs.USERWARE_LAST_LOGIN_MIN_INTERVAL
+    if interval and not cache.add('{}:recent:{}'.format(KEY_PREFIX, user.pk), 1, interval):
+        return
+    user.last_login = timezone.now()
+    if cache.add(SEQUENCE_KEY, 0, None):
+        # numbering (re)starts, make sure the next flush scans from the start
+        cache.set(FLUSHED_KEY, 0, None)
+    number = cache.incr(SEQUENCE_KEY)
+    cache.set(get_entry_key(number), (user.pk, user.last_login), defs.USERWARE_LAST_LOGIN_ENTRY_TTL)
+    if defs.USERWARE_LAST_LOGIN_FLUSH_INTERVAL:
+        flusher.ensure_running()
+
+
+def flush_last_logins(batch_size=None):
+    """
+    Writes buffered login times, one UPDATE per batch. Returns the number of users updated.
+    Does nothing while another process is flushing.
+    """
+    batch_size = batch_size or defs.USERWARE_LAST_LOGIN_BATCH_SIZE
+    cache = get_cache()
+    if not cache.add(LOCK_KEY, os.getpid(), LOCK_TIMEOUT):
+        return 0
+    try:
+        return _flush(cache, batch_size)
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _flush(cache, batch_size):
+    User = get_user_model()
+    now = time.time()
+    gaps = cache.get(GAPS_KEY) or {}
+    flushed = cache.get(FLUSHED_KEY, 0)
+    sequence = cache.get(SEQUENCE_KEY, 0)
+    if sequence < flushed:
+        log.warning('Last login counter went back from {} to {}, rescanning'.format(flushed, sequence))
+        flushed = 0
+    numbers = sorted(set(gaps) | set(range(flushed + 1, sequence + 1)))
+    updated = 0
+    for start in range(0, len(numbers), batch_size):
+        keys = dict((get_entry_key(number), number) for number in numbers[start:start + batch_size])
+        entries = cache.get_many(keys.keys())
+        for key, number in keys.items():
+            if key in entries:
+                gaps.pop(number, None)
+            elif now - gaps.setdefault(number, now) >= defs.USERWARE_LAST_LOGIN_ENTRY_TTL:
+                # numbered but never written (or evicted), give up on it.
+                del gaps[number]
+        latest = {}
+        for user_id, last_login in entries.values():
+            if user_id not in latest or latest[user_id] < last_login:
+                latest[user_id] = last_login
+        if latest:
+            whens = [When(pk=user_id, then=Value(last_login)) for user_id, last_login in latest.items()]
+            updated += User.objects.filter(pk__in=latest.keys()).update(
+                last_login=Case(*whens, output_field=DateTimeField()))
+        cache.delete_many(list(entries.keys()))
+    cache.set(GAPS_KEY, gaps, None)
+    cache.set(FLUSHED_KEY, sequence, None)
+    return updated
+
+
+class _Flusher(BackgroundThread):
+    """
+    Background thread flushing buffered login times every `USERWARE_LAST_LOGIN_FLUSH_INTERVAL` seconds.
+    """
+    name = 'userware-last-login'
+
+    def run(self):
+        while True:
+            time.sleep(defs.USERWARE_LAST_LOGIN_FLUSH_INTERVAL)
+            try:
+                flush_last_logins()
+            except Exception:
+                log.exception('Flushing buffered last logins failed')
+            finally:
+                close_old_connections()
+
+
+flusher = _Flusher()
+
+
+def enable():
+    """
+    Replaces Django's `update_last_login` receiver with the coalescing one.
+    """
+    user_logged_in.disconnect(update_last_login)
+    user_logged_in.disconnect(update_last_login, dispatch_uid='update_last_login')
+    user_logged_in.connect(record_last_login, dispatch_uid='userware_record_last_login')
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from ...archive import archive_users
+from ...archive import get_archivable_users
+from ...models import ArchivedUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves disabled (and optionally dormant) users to the ArchivedUser table in batches. "
+        "Can be run as a cronjob."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=[ArchivedUser.MODE_DELETE, ArchivedUser.MODE_TOMBSTONE],
+            default=None, help="Keep a tombstone, or delete the users that nothing else refers to. "
+                 "(default: USERWARE_ARCHIVE_MODE)")
+        parser.add_argument('--dormant-days', type=int, default=None,
+            help="Also archive users who haven't logged in for this many days.")
+        parser.add_argument('--batch-size', type=int, default=None,
+            help="Users archived per transaction. (default: USERWARE_ARCHIVE_BATCH_SIZE)")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the users.")
+
+    def handle(self, **options):
+        users = get_archivable_users(options['dormant_days'])
+        if options['dry_run']:
+            self.stdout.write("Would archive {} user(s).".format(users.count()))
+            return
+        reason = 'dormant' if options['dormant_days'] else 'disabled'
+        count = archive_users(users, options['mode'], reason, options['batch_size'])
+        self.stdout.write("Archived {} user(s).".format(count))
@@ -0,0 +1,65 @@
+import io
+import sys
+import gzip
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from ...sortedfile import PAD
+from ...sortedfile import external_sort
+from ...sortedfile import write_sorted_file
+from ...validators import blocklist_key
+
+
+class Command(BaseCommand):
+    help = (
+        "Compiles one or more wordlists (one password per line, optionally gzipped, "
+        "`-` for stdin) into a sorted, fixed-width blocklist for CommonPasswordValidator."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+', help="Wordlist files.")
+        parser.add_argument('--output', required=True, help="Path of the compiled blocklist.")
+        parser.add_argument('--width', type=int, default=32,
+            help="Record width in bytes. Longer entries are skipped. (default: 32)")
+        parser.add_argument('--chunk-size', type=int, default=1000000,
+            help="Entries sorted in memory before spilling to disk. (default: 1000000)")
+        parser.add_argument('--tmpdir', default=None, help="Directory for temporary sort runs.")
+
+    def handle(self, **options):
+        width = options['width']
+        self.skipped = 0
+        records = self.iter_records(options['sources'], width)
+        sorted_records = external_sort(records, width, options['chunk_size'], options['tmpdir'])
+        try:
+            count = write_sorted_file(options['output'], sorted_records, width)
+        except (IOError, OSError) as e:
+            raise CommandError(str(e))
+        self.stdout.write("Wrote {} entries to {} ({} skipped).".format(
+            count, options['output'], self.skipped))
+
+    def iter_records(self, sources, width):
+        for source in sources:
+            fh = self.open_source(source)
+            try:
+                for line in fh:
+                    key = blocklist_key(line.decode('utf-8', 'ignore'))
+                    if not key:
+                        continue
+                    if len(key) > width or PAD in key:
+                        self.skipped += 1
+                        continue
+                    yield key.ljust(width, PAD)
+            finally:
+                if source != '-':
+                    fh.close()
+
+    def open_source(self, source):
+        if source == '-':
+            return getattr(sys.stdin, 'buffer', sys.stdin)
+        try:
+            if source.endswith('.gz'):
+                return gzip.open(source, 'rb')
+            return io.open(source, 'rb')
+        except (IOError, OSError) as e:
+            raise CommandError(str(e))
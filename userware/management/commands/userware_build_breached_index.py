@@ -0,0 +1,63 @@
+import io
+import os
+import re
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from ...hashindex import SHA1_HEX_LENGTH
+from ...hashindex import build_index
+
+RANGE_PREFIX_LENGTH = 5
+HEX_RE = re.compile(r'^[0-9A-F]+$')
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the offline breached password index for BreachedPasswordValidator. "
+        "Sources are k-anonymity range files named after their 5 character hash prefix "
+        "(lines of `SUFFIX:COUNT`), or files of full `HASH:COUNT` lines, all in hash order. "
+        "Directories are expanded to the files they contain."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+', help="Range files, hash files or directories.")
+        parser.add_argument('--output', required=True, help="Directory of the index.")
+        parser.add_argument('--prefix-length', type=int, default=2,
+            help="Hex characters per shard name, must be even. (default: 2)")
+
+    def handle(self, **options):
+        output = options['output']
+        if not os.path.isdir(output):
+            os.makedirs(output)
+        try:
+            count = build_index(self.iter_entries(options['sources']), output, options['prefix_length'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write("Wrote {} hashes to {}.".format(count, output))
+
+    def iter_paths(self, sources):
+        for source in sources:
+            if os.path.isdir(source):
+                for name in sorted(os.listdir(source)):
+                    yield os.path.join(source, name)
+            else:
+                yield source
+
+    def iter_entries(self, sources):
+        """
+        Streams `(sha1_hex, count)` pairs from all sources, one line at a time.
+        """
+        for path in self.iter_paths(sources):
+            stem = os.path.splitext(os.path.basename(path))[0].upper()
+            with io.open(path, 'r', encoding='ascii') as fh:
+                for line in fh:
+                    digest, _, count = line.strip().partition(':')
+                    digest = digest.upper()
+                    if len(digest) == SHA1_HEX_LENGTH - RANGE_PREFIX_LENGTH:
+                        digest = stem + digest
+                    if len(digest) != SHA1_HEX_LENGTH or not HEX_RE.match(digest):
+                        if line.strip():
+                            raise CommandError("Invalid line in {}: {}".format(path, line.strip()))
+                        continue
+                    yield digest, int(count or 1)
@@ -0,0 +1,38 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from ...export import iter_export
+
+
+class Command(BaseCommand):
+    help = "Streams users as CSV or JSON lines, with flat memory use."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--output', default='-', help="Output file. (default: stdout)")
+        parser.add_argument('--fields', default=None,
+            help="Comma separated fields. (default: USERWARE_EXPORT_FIELDS)")
+        parser.add_argument('--filter', action='append', default=[], metavar='LOOKUP=VALUE',
+            help="Queryset filter, e.g. --filter is_active=1. Can be repeated.")
+        parser.add_argument('--chunk-size', type=int, default=None,
+            help="Rows per query. (default: USERWARE_EXPORT_CHUNK_SIZE)")
+
+    def handle(self, **options):
+        try:
+            lookups = dict(f.split('=', 1) for f in options['filter'])
+        except ValueError:
+            raise CommandError("Filters must be of the form LOOKUP=VALUE.")
+        queryset = get_user_model().objects.filter(**lookups)
+        fields = options['fields'].split(',') if options['fields'] else None
+
+        lines = iter_export(queryset, options['format'], fields, options['chunk_size'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with io.open(options['output'], 'w', encoding='utf-8', newline='') as out:
+            for line in lines:
+                out.write(line)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from ...lastlogin import flush_last_logins
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the login times buffered by USERWARE_LAST_LOGIN_COALESCE to the user table. "
+        "Can be run as a cronjob."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+            help="Buffered logins written per UPDATE. (default: USERWARE_LAST_LOGIN_BATCH_SIZE)")
+
+    def handle(self, **options):
+        updated = flush_last_logins(options['batch_size'])
+        self.stdout.write("Updated last login of {} user(s).".format(updated))
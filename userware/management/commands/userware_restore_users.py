@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from ...archive import restore_user
+from ...models import ArchivedUser
+
+
+class Command(BaseCommand):
+    help = "Restores archived users, given their usernames, emails or ids."
+
+    def add_arguments(self, parser):
+        parser.add_argument('users', nargs='+', help="Usernames, emails or ids of archived users.")
+
+    def handle(self, **options):
+        for value in options['users']:
+            archived = ArchivedUser.objects.filter(username=value) | ArchivedUser.objects.filter(email=value)
+            if value.isdigit():
+                archived |= ArchivedUser.objects.filter(user_id=int(value))
+            matches = list(archived.values_list('user_id', flat=True))
+            if len(matches) != 1:
+                raise CommandError("{} archived user(s) match '{}'.".format(len(matches), value))
+            try:
+                user = restore_user(matches[0])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write("Restored {}.".format(user.username))
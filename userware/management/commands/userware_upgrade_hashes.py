@@ -0,0 +1,88 @@
+import io
+import os
+import multiprocessing
+
+import django
+from django.db import connections
+from django.db.models import Max
+from django.db.models import Min
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from ...hashers import WRAPPED_HASHERS
+from ...hashers import get_legacy_filter
+from ...hashers import upgrade_hashes
+
+
+def init_worker():
+    django.setup()
+
+
+def run_chunk(bounds):
+    start, stop = bounds
+    try:
+        return bounds, upgrade_hashes(start, stop)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Wraps legacy SHA1 / MD5 password hashes, salted or unsalted, with PBKDF2, without requiring "
+        "a login. Users are processed in primary key ranges (aligned to multiples of --batch-size) "
+        "across a process pool, one transaction per range. With --state-file, finished ranges are "
+        "recorded and skipped when the command is run again with the same --batch-size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+            help="Primary keys per range. (default: 1000)")
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+            help="Worker processes. (default: cpu count)")
+        parser.add_argument('--state-file', default=None,
+            help="File recording finished ranges, to resume an interrupted run.")
+
+    def handle(self, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1 or options['processes'] < 1:
+            raise CommandError("--batch-size and --processes must be positive.")
+
+        paths = ['{}.{}'.format(hasher.__module__, hasher.__name__) for hasher in WRAPPED_HASHERS]
+        if not set(paths).issubset(settings.PASSWORD_HASHERS):
+            self.stderr.write("Warning: {} are not in PASSWORD_HASHERS. Wrapped hashes are then only "
+                              "recognized by userware.backends.ModelBackend and userware's forms.".format(
+                                  ', '.join(paths)))
+
+        bounds = get_user_model().objects.filter(get_legacy_filter()).aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write("No legacy hashes to upgrade.")
+            return
+
+        state_file = options['state_file']
+        done = set()
+        if state_file and os.path.exists(state_file):
+            with io.open(state_file, 'r', encoding='ascii') as fh:
+                done = set(tuple(int(pk) for pk in line.split()) for line in fh if line.strip())
+        first = bounds['low'] // batch_size * batch_size
+        chunks = [
+            (start, start + batch_size)
+            for start in range(first, bounds['high'] + 1, batch_size)
+            if (start, start + batch_size) not in done
+        ]
+
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        total = 0
+        pool = multiprocessing.Pool(options['processes'], initializer=init_worker)
+        try:
+            for (start, stop), count in pool.imap_unordered(run_chunk, chunks):
+                total += count
+                if state_file:
+                    with io.open(state_file, 'a', encoding='ascii') as fh:
+                        fh.write(u'{} {}\n'.format(start, stop))
+        finally:
+            pool.close()
+            pool.join()
+        self.stdout.write("Wrapped {} hashes in {} ranges.".format(total, len(chunks)))
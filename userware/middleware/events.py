@@ -0,0 +1,13 @@
+from .. import events
+
+
+class UserEventMiddleware(object):
+    """
+    Middleware that queues userware events for the request and delivers them in one batch.
+    """
+    def process_request(self, request):
+        events.bus.start_request()
+
+    def process_response(self, request, response):
+        events.bus.finish_request()
+        return response
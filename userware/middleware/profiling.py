@@ -0,0 +1,147 @@
+import time
+import random
+import pstats
+import logging
+import cProfile
+import threading
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.contrib.auth import SESSION_KEY
+from django.utils.six import StringIO
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from ..conf import settings as defs
+
+TOKEN_SALT = 'userware.middleware.profiling'
+
+log = logging.getLogger('userware.profiling')
+
+# tracemalloc is process wide, only one request at a time may trace memory.
+memory_lock = threading.Lock()
+
+
+def make_profile_token():
+    """
+    Returns a signed value for the profiling header, forcing a profile of that request.
+    """
+    return signing.dumps('profile', salt=TOKEN_SALT)
+
+
+class _Profile(object):
+    """
+    A running profile of one request: cProfile, SQL queries (of every database) and
+    (optionally) memory.
+    """
+    def __init__(self, trace_memory):
+        self.trace_memory = (trace_memory and tracemalloc is not None and
+                             not tracemalloc.is_tracing() and memory_lock.acquire(False))
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        # connections are per thread; give each one a fresh query log for this request.
+        self.saved = []
+        for conn in connections.all():
+            self.saved.append((conn, conn.force_debug_cursor, conn.queries_log))
+            conn.force_debug_cursor = True
+            conn.queries_log = deque(maxlen=conn.queries_limit)
+        self.started_at = time.time()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.elapsed = time.time() - self.started_at
+        self.queries = []
+        for conn, force_debug_cursor, queries_log in self.saved:
+            self.queries.extend(dict(query, alias=conn.alias) for query in conn.queries_log)
+            queries_log.extend(conn.queries_log)
+            conn.queries_log = queries_log
+            conn.force_debug_cursor = force_debug_cursor
+        self.memory = None
+        if self.trace_memory:
+            try:
+                self.memory = tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            finally:
+                memory_lock.release()
+
+    def report(self, request, status):
+        out = StringIO()
+        session = getattr(request, 'session', {})
+        sql_time = sum(float(query['time']) for query in self.queries)
+        out.write('{} {} [{}] {} -> {} in {:.1f}ms, {} queries in {:.1f}ms\n'.format(
+            request.method, request.path, request.resolver_match.url_name,
+            session.get(SESSION_KEY, '-'), status,
+            self.elapsed * 1000, len(self.queries), sql_time * 1000))
+        for query in self.queries:
+            out.write('  SQL {:>8.1f}ms  [{}] {}\n'.format(float(query['time']) * 1000, query['alias'], query['sql']))
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(defs.USERWARE_PROFILE_TOP_FUNCTIONS)
+        if self.memory:
+            snapshot, peak = self.memory
+            out.write('Memory peak {:.1f}KiB (process wide), top allocations:\n'.format(peak / 1024.0))
+            for stat in snapshot.statistics('lineno')[:defs.USERWARE_PROFILE_TOP_FUNCTIONS]:
+                out.write('  {}\n'.format(stat))
+        return out.getvalue()
+
+
+class UserProfilingMiddleware(object):
+    """
+    Middleware that profiles a sample of requests to the userware views
+    (`USERWARE_PROFILE_URL_NAMES`), or any of them carrying a signed profiling header.
+    Reports are written to a rotating log file. When `USERWARE_PROFILE_ENABLED` is off,
+    the middleware removes itself from the stack.
+    """
+    def __init__(self):
+        if not defs.USERWARE_PROFILE_ENABLED:
+            raise MiddlewareNotUsed
+        if not log.handlers:
+            handler = RotatingFileHandler(defs.USERWARE_PROFILE_LOG_FILE,
+                maxBytes=defs.USERWARE_PROFILE_LOG_MAX_BYTES,
+                backupCount=defs.USERWARE_PROFILE_LOG_BACKUP_COUNT)
+            log.addHandler(handler)
+            log.setLevel(logging.INFO)
+            log.propagate = False
+
+    def should_profile(self, request):
+        match = request.resolver_match
+        if match is None or match.url_name not in defs.USERWARE_PROFILE_URL_NAMES:
+            return False
+        token = request.META.get(defs.USERWARE_PROFILE_HEADER)
+        if token:
+            try:
+                signing.loads(token, salt=TOKEN_SALT, max_age=defs.USERWARE_PROFILE_TOKEN_MAX_AGE)
+                return True
+            except signing.BadSignature:
+                pass
+        rate = defs.USERWARE_PROFILE_SAMPLE_RATE
+        return bool(rate) and random.randint(1, rate) == 1
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.should_profile(request):
+            request._userware_profile = _Profile(defs.USERWARE_PROFILE_MEMORY)
+            request._userware_profile.start()
+
+    def process_exception(self, request, exception):
+        self.finish(request, 500)
+
+    def process_response(self, request, response):
+        self.finish(request, response.status_code)
+        return response
+
+    def finish(self, request, status):
+        profile = getattr(request, '_userware_profile', None)
+        if profile is None:
+            return
+        del request._userware_profile
+        profile.stop()
+        log.info(profile.report(request, status))
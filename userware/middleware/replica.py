@@ -0,0 +1,12 @@
+from .. import replicas
+
+
+class ReplicaPinMiddleware(object):
+    """
+    Middleware that keeps a client pinned to the primary database for a while after a write.
+    """
+    def process_request(self, request):
+        replicas.start_request(request)
+
+    def process_response(self, request, response):
+        return replicas.finish_request(response)
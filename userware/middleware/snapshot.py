@@ -0,0 +1,21 @@
+from django.utils.functional import SimpleLazyObject
+
+from .. import snapshot
+
+
+def get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = snapshot.get_user(request)
+    return request._cached_user
+
+
+class UserSnapshotMiddleware(object):
+    """
+    Drop-in replacement of `AuthenticationMiddleware` that builds `request.user` from
+    a session snapshot, skipping the user query (see `userware.snapshot`).
+    """
+    def process_request(self, request):
+        assert hasattr(request, 'session'), (
+            "The UserSnapshotMiddleware requires session middleware to be installed."
+        )
+        request.user = SimpleLazyObject(lambda: get_user(request))
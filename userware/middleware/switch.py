@@ -1,5 +1,8 @@
-from .. import defaults as defs
-from .. import utils as util
+from ..models import ImpersonationLog
+from ..conf import settings as defs
+from .. import snapshot
+from .. import audit
+from .. import events
 
 
 class UserSwitchMiddleware(object):
@@ -9,6 +12,9 @@ class UserSwitchMiddleware(object):
     def process_request(self, request):
         if defs.USERWARE_SWTICHED_USER_KEY in request.session:
             username = request.session[defs.USERWARE_SWTICHED_USER_KEY]
-            user = util.get_user_by_username_or_email(username)
+            user = snapshot.get_switched_user(request, username)
             if user:
+                request.original_user = request.user
                 request.user = user
+                audit.log_impersonation(ImpersonationLog.ACTION_REQUEST, username,
+                                        **events.get_request_context(request))
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userware', '0002_sessiongeneration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedUser',
+            fields=[
+                ('user_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('username', models.CharField(db_index=True, max_length=255)),
+                ('email', models.CharField(db_index=True, max_length=255)),
+                ('mode', models.CharField(choices=[('delete', 'Deleted'), ('tombstone', 'Tombstone')], max_length=10)),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('archived_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('data', models.TextField()),
+            ],
+            options={
+                'ordering': ('-archived_at',),
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+FIELDS = ['username', 'email']
+
+
+def get_index_name(table, field):
+    return '{}_{}_lower_like'.format(table, field)[-63:]
+
+
+def create_indexes(apps, schema_editor):
+    """
+    Indexes lower(username) and lower(email) for the switch user prefix search.
+    Created on PostgreSQL only, other backends scan for the search.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    for field in FIELDS:
+        schema_editor.execute('CREATE INDEX {} ON {} (LOWER({}) text_pattern_ops)'.format(
+            schema_editor.quote_name(get_index_name(table, field)),
+            schema_editor.quote_name(table),
+            schema_editor.quote_name(field),
+        ))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    for field in FIELDS:
+        schema_editor.execute('DROP INDEX IF EXISTS {}'.format(
+            schema_editor.quote_name(get_index_name(table, field))))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('userware', '0003_archiveduser'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
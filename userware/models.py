@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django.utils.encoding import python_2_unicode_compatible
+from django.utils.translation import ugettext_lazy as _
+
+AUTH_USER_MODEL = getattr(settings, 'AUTH_USER_MODEL', 'auth.User')
+
+
+@python_2_unicode_compatible
+class ImpersonationLog(models.Model):
+    """
+    Audit trail of staff members acting as (switched to) another user.
+    """
+    ACTION_SWITCH_ON = 'on'
+    ACTION_SWITCH_OFF = 'off'
+    ACTION_REQUEST = 'request'
+    ACTION_CHOICES = (
+        (ACTION_SWITCH_ON, _('Switched on')),
+        (ACTION_SWITCH_OFF, _('Switched off')),
+        (ACTION_REQUEST, _('Request')),
+    )
+
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    staff = models.ForeignKey(AUTH_USER_MODEL, related_name="%(class)s",
+        blank=True, null=True, on_delete=models.SET_NULL)
+    switched_username = models.CharField(max_length=255, db_index=True)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    method = models.CharField(max_length=10, blank=True)
+    path = models.CharField(max_length=255, blank=True)
+    ip_address = models.GenericIPAddressField(blank=True, null=True)
+
+    class Meta:
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return u"{} -> {} ({})".format(self.staff_id, self.switched_username, self.action)
+
+
+@python_2_unicode_compatible
+class SessionGeneration(models.Model):
+    """
+    Per-user session generation. Sessions stamped with an older generation are logged out.
+    """
+    user = models.OneToOneField(AUTH_USER_MODEL, related_name="%(class)s",
+        primary_key=True, on_delete=models.CASCADE)
+    generation = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return u"{} ({})".format(self.user_id, self.generation)
+
+
+@python_2_unicode_compatible
+class ArchivedUser(models.Model):
+    """
+    Cold copy of a user moved out of the user table (see `userware.archive`).
+    """
+    MODE_DELETE = 'delete'
+    MODE_TOMBSTONE = 'tombstone'
+    MODE_CHOICES = (
+        (MODE_DELETE, _('Deleted')),
+        (MODE_TOMBSTONE, _('Tombstone')),
+    )
+
+    user_id = models.BigIntegerField(primary_key=True)
+    username = models.CharField(max_length=255, db_index=True)
+    email = models.CharField(max_length=255, db_index=True)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    reason = models.CharField(max_length=255, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now, db_index=True)
+    data = models.TextField()
+
+    class Meta:
+        ordering = ('-archived_at',)
+
+    def __str__(self):
+        return u"{} ({})".format(self.username, self.mode)
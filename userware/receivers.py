@@ -0,0 +1,70 @@
+from django.core import signals as core_signals
+from django.db.models import signals as model_signals
+from django.contrib.auth import get_user_model
+from django.contrib.auth import signals as django_signals
+
+from .models import ImpersonationLog
+from .signals import user_switched_on
+from .signals import user_switched_off
+from . import audit
+from . import events
+from . import generations
+from . import snapshot
+from . import replicas
+
+
+def impersonation_audit(batch):
+    """ Record staff members switching to another user and back """
+    actions = {
+        events.SWITCHED_ON: ImpersonationLog.ACTION_SWITCH_ON,
+        events.SWITCHED_OFF: ImpersonationLog.ACTION_SWITCH_OFF,
+    }
+    for event in batch:
+        audit.log_impersonation(actions[event.name], event.payload['switched_username'], **event.context)
+
+
+def switch_signals_bridge(event):
+    """ Send the `user_switched_on` / `user_switched_off` signals, after commit """
+    signal = user_switched_on if event.name == events.SWITCHED_ON else user_switched_off
+    signal.send(sender=event.sender, request=event.payload.get('request'),
+                switched_username=event.payload['switched_username'])
+
+
+def session_generation_stamp(sender, user, request, **kwargs):
+    """ Stamp a new (stateless) session with the user's current generation """
+    if generations.is_enabled():
+        request.session[generations.GENERATION_SESSION_KEY] = generations.get_generation(user.pk)
+
+
+def user_snapshot_stamp(sender, user, request, **kwargs):
+    """ Snapshot the user into the new session """
+    if snapshot.is_enabled():
+        snapshot.store_snapshot(request.session, user)
+
+
+def user_snapshot_invalidate(sender, instance, update_fields=None, **kwargs):
+    """ Invalidate the user's session snapshots, unless only other fields were saved """
+    if not snapshot.is_enabled():
+        return
+    if update_fields and not set(update_fields) & set(snapshot.get_snapshot_fields(sender)):
+        return
+    snapshot.bump_version(instance.pk)
+
+
+def latch_to_signals():
+    """
+    Latch to the signals and events we are interested in.
+    """
+    events.subscribe(impersonation_audit, events=[events.SWITCHED_ON, events.SWITCHED_OFF], batch=True)
+    events.subscribe(switch_signals_bridge, events=[events.SWITCHED_ON, events.SWITCHED_OFF])
+    django_signals.user_logged_in.connect(session_generation_stamp,
+                                          dispatch_uid='userware_session_generation_stamp')
+    django_signals.user_logged_in.connect(user_snapshot_stamp,
+                                          dispatch_uid='userware_user_snapshot_stamp')
+    model_signals.post_save.connect(user_snapshot_invalidate, sender=get_user_model(),
+                                    dispatch_uid='userware_user_snapshot_invalidate_save')
+    model_signals.post_delete.connect(user_snapshot_invalidate, sender=get_user_model(),
+                                      dispatch_uid='userware_user_snapshot_invalidate_delete')
+    core_signals.request_started.connect(replicas.reset, dispatch_uid='userware_replicas_reset_started')
+    core_signals.request_finished.connect(replicas.reset, dispatch_uid='userware_replicas_reset_finished')
+    core_signals.request_finished.connect(events.bus.finish_request, dispatch_uid='userware_events_finish')
@@ -0,0 +1,73 @@
+"""
+Read-replica selection for userware lookups, with read-your-writes stickiness.
+
+Only userware's own lookups (made through `get_user_manager()`) go to a replica; any other
+read of the user model is left to the project's routers. After a write, the client is pinned
+to the primary database for `USERWARE_REPLICA_PIN_SECONDS` through a cookie, so it never reads
+its own change back from a lagging replica.
+"""
+import random
+import threading
+
+from django.db import DEFAULT_DB_ALIAS
+from django.contrib.auth import get_user_model
+
+from .conf import settings as defs
+
+LOOKUP_HINT = 'userware_lookup'
+
+_state = threading.local()
+
+
+def get_user_manager():
+    """
+    Returns the user manager for userware lookups, which `ReplicaRouter` may send to a replica.
+    """
+    return get_user_model()._default_manager.db_manager(hints={LOOKUP_HINT: True})
+
+
+def pin_to_primary():
+    """
+    Sends the remaining reads of this request, and of the client's next requests, to the primary.
+    """
+    _state.pinned = True
+    _state.pin_requested = True
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def get_read_database():
+    """
+    Returns the database alias userware lookups should read from, None without replicas.
+    """
+    replicas = defs.USERWARE_REPLICA_DATABASES
+    if not replicas:
+        return None
+    if is_pinned():
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+def start_request(request):
+    _state.pinned = defs.USERWARE_REPLICA_PIN_COOKIE in request.COOKIES
+    _state.pin_requested = False
+
+
+def finish_request(response):
+    try:
+        if getattr(_state, 'pin_requested', False):
+            response.set_cookie(defs.USERWARE_REPLICA_PIN_COOKIE, '1',
+                                max_age=defs.USERWARE_REPLICA_PIN_SECONDS, httponly=True)
+    finally:
+        reset()
+    return response
+
+
+def reset(**kwargs):
+    """
+    Forgets the pin of the current request. Connected to `request_started` / `request_finished`,
+    so a pin never leaks into the next request handled by the thread.
+    """
+    _state.pinned = _state.pin_requested = False
@@ -0,0 +1,32 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.conf import settings
+
+from .conf import settings as defs
+from . import replicas
+
+
+class ReplicaRouter(object):
+    """
+    Routes userware's lookups of the user model to a replica (unless the client is pinned to
+    the primary) and all writes of it to the primary. Any write pins the client to the primary.
+    Other reads are left to the next routers.
+    """
+    def is_user_model(self, model):
+        return model._meta.label == settings.AUTH_USER_MODEL
+
+    def db_for_read(self, model, **hints):
+        if self.is_user_model(model) and hints.get(replicas.LOOKUP_HINT):
+            return replicas.get_read_database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if self.is_user_model(model):
+            replicas.pin_to_primary()
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = [DEFAULT_DB_ALIAS] + list(defs.USERWARE_REPLICA_DATABASES)
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
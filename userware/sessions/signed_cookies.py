@@ -0,0 +1,91 @@
+"""
+Stateless session engine. The session lives in a compact signed (optionally encrypted) cookie.
+
+    SESSION_ENGINE = 'userware.sessions.signed_cookies'
+
+Forced logouts are enforced through a per-user generation number (see `userware.generations`)
+instead of deleting sessions server side.
+"""
+import base64
+import hashlib
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth import HASH_SESSION_KEY
+from django.contrib.sessions.backends import signed_cookies
+from django.utils.encoding import force_bytes
+
+from ..conf import settings as defs
+from .. import generations
+from .. import snapshot
+
+SALT = 'userware.sessions.signed_cookies'
+
+
+def get_compact_keys():
+    """
+    Returns the mapping of well known session keys to their short cookie names.
+    """
+    return {
+        SESSION_KEY: '~u',
+        BACKEND_SESSION_KEY: '~b',
+        HASH_SESSION_KEY: '~h',
+        generations.GENERATION_SESSION_KEY: '~g',
+        defs.USERWARE_SWTICHED_USER_KEY: '~s',
+        snapshot.SNAPSHOT_SESSION_KEY: '~p',
+        snapshot.SWITCHED_SNAPSHOT_SESSION_KEY: '~q',
+        '_messages': '~m',
+    }
+
+
+def get_fernet():
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        raise ImproperlyConfigured("USERWARE_SESSION_ENCRYPT requires the `cryptography` package.")
+    key = hashlib.sha256(force_bytes(SALT + settings.SECRET_KEY)).digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+class SessionStore(signed_cookies.SessionStore):
+
+    def load(self):
+        """
+        Decodes the cookie, discarding it if it is tampered with, expired or if its
+        generation is older than the user's current one.
+        """
+        try:
+            data = self.decode_cookie(self.session_key)
+        except Exception:
+            # BadSignature, InvalidToken or ValueError. Reset the session.
+            self.create()
+            return {}
+        user_id = data.get(SESSION_KEY)
+        if user_id is not None:
+            generation = data.get(generations.GENERATION_SESSION_KEY, 0)
+            if generation != generations.get_generation(user_id):
+                self.create()
+                return {}
+        return data
+
+    def _get_session_key(self):
+        return self.encode_cookie(getattr(self, '_session_cache', {}))
+
+    def encode_cookie(self, data):
+        compact = get_compact_keys()
+        data = dict((compact.get(key, key), value) for key, value in data.items())
+        value = signing.dumps(data, compress=True, salt=SALT, serializer=self.serializer)
+        if defs.USERWARE_SESSION_ENCRYPT:
+            value = get_fernet().encrypt(force_bytes(value)).decode('ascii')
+        return value
+
+    def decode_cookie(self, value):
+        if defs.USERWARE_SESSION_ENCRYPT:
+            value = get_fernet().decrypt(force_bytes(value)).decode('ascii')
+        data = signing.loads(value, salt=SALT, serializer=self.serializer,
+                             max_age=settings.SESSION_COOKIE_AGE)
+        expanded = dict((short, key) for key, short in get_compact_keys().items())
+        return dict((expanded.get(key, key), value) for key, value in data.items())
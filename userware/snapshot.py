@@ -0,0 +1,160 @@
+"""
+Session embedded user snapshots.
+
+At login, the user's hot fields (`USERWARE_USER_SNAPSHOT_FIELDS`) are stored in the session
+with the user's current snapshot version. While the version is current, `request.user` is
+built from the snapshot without querying the user table; other fields are loaded on access.
+Saving or deleting a user bumps its version (kept in a cache), so the next request reloads
+it from the database. Switched users (`su`) are snapshotted the same way.
+
+The version cache must be shared by every process (e.g. memcached or redis), otherwise a
+bump is only seen by the process that made it. Versions expire after
+`USERWARE_USER_SNAPSHOT_VERSION_TTL` seconds, which bounds how long a lost bump goes unseen.
+
+Snapshot fields updated with `QuerySet.update()` must be followed by `bump_version()`.
+"""
+from django.db import router
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib import auth
+from django.contrib.auth import get_user_model
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.utils.crypto import get_random_string
+
+from .conf import settings as defs
+
+SNAPSHOT_SESSION_KEY = '_userware_user'
+SWITCHED_SNAPSHOT_SESSION_KEY = '_userware_switched_user'
+
+
+def is_enabled():
+    return defs.USERWARE_USER_SNAPSHOT
+
+
+def get_cache():
+    cache = caches[defs.USERWARE_USER_SNAPSHOT_CACHE]
+    if isinstance(cache, LocMemCache):
+        raise ImproperlyConfigured(
+            "USERWARE_USER_SNAPSHOT_CACHE ({}) is a per process LocMemCache, snapshots need "
+            "a cache shared by every process.".format(defs.USERWARE_USER_SNAPSHOT_CACHE))
+    return cache
+
+
+def get_cache_key(user_id):
+    return 'userware:snapshot:{}'.format(user_id)
+
+
+def get_version(user_id):
+    """
+    Returns the current snapshot version of a user, None if the cache can't hold one.
+    """
+    cache = get_cache()
+    key = get_cache_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, get_random_string(12), defs.USERWARE_USER_SNAPSHOT_VERSION_TTL)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_id):
+    """
+    Invalidates all snapshots of a user.
+    """
+    get_cache().set(get_cache_key(user_id), get_random_string(12), defs.USERWARE_USER_SNAPSHOT_VERSION_TTL)
+
+
+def get_snapshot_fields(User):
+    fields = set(defs.USERWARE_USER_SNAPSHOT_FIELDS)
+    return [f.attname for f in User._meta.concrete_fields if f.attname in fields and not f.primary_key]
+
+
+def make_snapshot(user, version, **extra):
+    snapshot = {
+        'pk': user.pk,
+        'version': version,
+        'fields': dict((name, getattr(user, name)) for name in get_snapshot_fields(type(user))),
+    }
+    snapshot.update(extra)
+    return snapshot
+
+
+def load_snapshot(snapshot):
+    """
+    Returns the user of a current snapshot (with every other field deferred), or None.
+    """
+    if not snapshot:
+        return None
+    version = get_version(snapshot['pk'])
+    if version is None or snapshot['version'] != version:
+        return None
+    User = get_user_model()
+    fields = snapshot['fields']
+    if set(fields) != set(get_snapshot_fields(User)):
+        return None
+    names, values = [], []
+    for field in User._meta.concrete_fields:
+        if field.primary_key:
+            names.append(field.attname)
+            values.append(snapshot['pk'])
+        elif field.attname in fields:
+            names.append(field.attname)
+            values.append(fields[field.attname])
+    return User.from_db(router.db_for_read(User), names, values)
+
+
+def store_snapshot(session, user, version=None):
+    session[SNAPSHOT_SESSION_KEY] = make_snapshot(user, version or get_version(user.pk))
+
+
+def get_user(request):
+    """
+    Returns the user of the request, from its session snapshot when current, otherwise
+    from the database (through `django.contrib.auth.get_user`, refreshing the snapshot).
+    """
+    if not is_enabled():
+        return auth.get_user(request)
+    session = request.session
+    user_id = session.get(SESSION_KEY)
+    backend_path = session.get(BACKEND_SESSION_KEY)
+    if user_id is None or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    snapshot = session.get(SNAPSHOT_SESSION_KEY)
+    if snapshot and str(snapshot['pk']) == str(user_id):
+        user = load_snapshot(snapshot)
+        if user is not None and user.is_active:
+            user.backend = backend_path
+            return user
+
+    version = get_version(user_id)
+    user = auth.get_user(request)
+    if user.is_authenticated() and version is not None:
+        store_snapshot(session, user, version)
+    return user
+
+
+def get_switched_user(request, username):
+    """
+    Returns the user switched to by `username`, from its session snapshot when current.
+    """
+    # imported here, so loading the app (receivers) doesn't pull in the user lookups
+    from . import utils as util
+    if not is_enabled():
+        return util.get_user_by_username_or_email(username)
+    session = request.session
+    snapshot = session.get(SWITCHED_SNAPSHOT_SESSION_KEY)
+    if snapshot and snapshot.get('username') == username:
+        user = load_snapshot(snapshot)
+        if user is not None:
+            return user
+
+    user = util.get_user_by_username_or_email(username)
+    if user is not None:
+        version = get_version(user.pk)
+        if version is not None:
+            session[SWITCHED_SNAPSHOT_SESSION_KEY] = make_snapshot(user, version, username=username)
+    return user
@@ -0,0 +1,161 @@
+"""
+Sorted, fixed-width record files that are memory-mapped and binary-searched.
+
+The file is a small header followed by records of `record_size` bytes, sorted by their
+first `key_size` bytes. Lookups touch O(log n) pages of a read-only mapping, so the data
+lives in the OS page cache and is shared by every process that opens the same file.
+
+This module does not depend on Django.
+"""
+import os
+import mmap
+import heapq
+import struct
+import tempfile
+import threading
+
+MAGIC = b'USERWARE'
+HEADER = struct.Struct('>8sHH')
+PAD = b'\0'
+
+
+class SortedFile(object):
+    """
+    Read-only view over a sorted file.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fh:
+            magic, self.record_size, self.key_size = HEADER.unpack(fh.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("Not a userware sorted file: '{}'".format(path))
+            size = os.fstat(fh.fileno()).st_size
+            self.count = (size - HEADER.size) // self.record_size
+            self.data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b''
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return self.find(key) is not None
+
+    def find(self, key):
+        """
+        Returns the record whose key equals `key` (right-padded with NULs), or None.
+        """
+        if len(key) > self.key_size:
+            return None
+        key = key.ljust(self.key_size, PAD)
+        data, record_size, key_size = self.data, self.record_size, self.key_size
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * record_size
+            probe = data[offset:offset + key_size]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return data[offset:offset + record_size]
+        return None
+
+    def close(self):
+        if self.count:
+            self.data.close()
+
+
+def write_sorted_file(path, records, record_size, key_size=None):
+    """
+    Writes already sorted `records` to `path`, dropping records with a duplicate key.
+    The file is written next to `path` and renamed into place once complete.
+    Returns the number of records written.
+    """
+    key_size = key_size or record_size
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.userware-')
+    count = 0
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(HEADER.pack(MAGIC, record_size, key_size))
+            previous = None
+            for record in records:
+                if len(record) != record_size:
+                    raise ValueError("Record size {} != {}".format(len(record), record_size))
+                key = record[:key_size]
+                if previous is not None:
+                    if key < previous:
+                        raise ValueError("Records are not sorted")
+                    if key == previous:
+                        continue
+                fh.write(record)
+                previous = key
+                count += 1
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return count
+
+
+def _read_run(path, record_size):
+    with open(path, 'rb') as fh:
+        while True:
+            record = fh.read(record_size)
+            if len(record) < record_size:
+                return
+            yield record
+
+
+def external_sort(records, record_size, chunk_size=1000000, tmpdir=None):
+    """
+    Sorts an arbitrarily large iterable of fixed-width records, holding at most
+    `chunk_size` records in memory. Sorted runs are spilled to disk and merged.
+    """
+    run_paths = []
+    try:
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                run_paths.append(_write_run(sorted(chunk), tmpdir))
+                chunk = []
+        if not run_paths:
+            for record in sorted(chunk):
+                yield record
+            return
+        if chunk:
+            run_paths.append(_write_run(sorted(chunk), tmpdir))
+        chunk = None
+        for record in heapq.merge(*[_read_run(p, record_size) for p in run_paths]):
+            yield record
+    finally:
+        for path in run_paths:
+            os.remove(path)
+
+
+def _write_run(chunk, tmpdir):
+    fd, path = tempfile.mkstemp(dir=tmpdir, prefix='userware-run-')
+    with os.fdopen(fd, 'wb') as fh:
+        fh.writelines(chunk)
+    return path
+
+
+_open_files = {}
+_open_lock = threading.Lock()
+
+
+def open_sorted_file(path):
+    """
+    Returns a process-wide shared `SortedFile` for `path`, mapping it on first use.
+    """
+    try:
+        return _open_files[path]
+    except KeyError:
+        pass
+    with _open_lock:
+        if path not in _open_files:
+            _open_files[path] = SortedFile(path)
+        return _open_files[path]
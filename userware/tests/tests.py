@@ -1,4 +1,61 @@
+import os
+import shutil
+import tempfile
+
 from django.test import TestCase
+from django.test import SimpleTestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test import RequestFactory
+from django.http import HttpResponse
+from django.http import HttpResponseRedirect
+from django.contrib.auth.models import AnonymousUser
+from django.utils import timezone
+from django.core.exceptions import ValidationError
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
+from django.db import transaction
+from django.contrib.auth import get_user_model
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth import HASH_SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore as DbSessionStore
+from django.contrib.sessions.backends.signed_cookies import SessionStore as SignedCookieStore
+from django.contrib.auth.hashers import make_password
+
+from userware.audit import AuditBuffer
+from userware.models import ImpersonationLog
+from userware.conf import settings as defs
+from userware.sortedfile import SortedFile
+from userware.sortedfile import external_sort
+from userware.sortedfile import write_sorted_file
+from userware.validators import CommonPasswordValidator
+from userware.validators import BreachedPasswordValidator
+from userware.validators import MinimumLengthValidator
+from userware.validators import PasswordPipeline
+from userware.validators import COST_KDF
+from userware.hashindex import BreachedHashIndex
+from userware.hashindex import build_index
+from userware.hashindex import sha1_hex
+from userware.sessions.signed_cookies import SessionStore
+from userware import generations
+from userware.events import Event
+from userware.events import EventBus
+from userware.background import BackgroundThread
+from userware.backends import ModelBackend
+from userware.hashers import upgrade_hashes
+from userware import utils as util
+from userware.archive import archive_users
+from userware.archive import get_archivable_users
+from userware.archive import restore_user
+from userware.models import ArchivedUser
+from userware.idempotency import idempotent
+from userware import snapshot
+from userware import lastlogin
+from userware import replicas
+from userware.routers import ReplicaRouter
+from userware.middleware.profiling import _Profile
+from userware.export import iter_rows
 
 
 class UserwareTest(TestCase):
@@ -7,3 +64,700 @@ class UserwareTest(TestCase):
     """
     def test_userware(self):
         pass
+
+
+class AuditBufferTest(TestCase):
+    """
+    Tests the buffered impersonation audit writer.
+    """
+    def add_record(self, buf):
+        buf.add(staff_id=None, switched_username='jane', action=ImpersonationLog.ACTION_REQUEST)
+
+    def test_buffer_holds_records_until_size_threshold(self):
+        buf = AuditBuffer('ImpersonationLog', size=3, interval=3600)
+        self.add_record(buf)
+        self.add_record(buf)
+        self.assertEqual(ImpersonationLog.objects.count(), 0)
+        self.add_record(buf)
+        self.assertEqual(ImpersonationLog.objects.count(), 3)
+        self.assertEqual(buf.pending, [])
+
+    def test_flush_writes_pending_records(self):
+        buf = AuditBuffer('ImpersonationLog', size=100, interval=3600)
+        self.add_record(buf)
+        buf.flush()
+        self.assertEqual(ImpersonationLog.objects.count(), 1)
+
+
+class SettingsTest(TestCase):
+    """
+    Tests the lazy userware settings.
+    """
+    def test_default_is_used_when_not_overridden(self):
+        self.assertEqual(defs.USERWARE_PASSWORD_MIN_LENGTH, 6)
+        self.assertIn('admin', defs.USERWARE_RESERVED_USERNAMES)
+
+    def test_override_settings_is_picked_up(self):
+        with override_settings(USERWARE_PASSWORD_MIN_LENGTH=12):
+            self.assertEqual(defs.USERWARE_PASSWORD_MIN_LENGTH, 12)
+        self.assertEqual(defs.USERWARE_PASSWORD_MIN_LENGTH, 6)
+
+
+class SortedFileTest(SimpleTestCase):
+    """
+    Tests the memory-mapped sorted file and the common password validator.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'blocklist')
+        words = [b'password', b'letmein', b'123456', b'dragon', b'letmein']
+        records = (w.ljust(16, b'\0') for w in words)
+        self.count = write_sorted_file(self.path, external_sort(records, 16, chunk_size=2), 16)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_lookup(self):
+        blocklist = SortedFile(self.path)
+        self.assertEqual(self.count, 4)
+        self.assertIn(b'dragon', blocklist)
+        self.assertNotIn(b'dragons', blocklist)
+        self.assertNotIn(b'a' * 20, blocklist)
+        blocklist.close()
+
+    def test_common_password_validator(self):
+        validator = CommonPasswordValidator(path=self.path)
+        self.assertRaises(ValidationError, validator.validate, ' LetMeIn ')
+        self.assertIsNone(validator.validate('correct horse'))
+
+
+class BreachedHashIndexTest(SimpleTestCase):
+    """
+    Tests the offline breached password index.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        entries = sorted([(sha1_hex(u'password'), 3730471), (sha1_hex(u'hunter2'), 17043)])
+        build_index(entries, self.tmpdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_count(self):
+        index = BreachedHashIndex(self.tmpdir)
+        self.assertEqual(index.count(sha1_hex(u'password')), 3730471)
+        self.assertEqual(index.count(sha1_hex(u'password').lower()), 3730471)
+        self.assertEqual(index.count(sha1_hex(u'not breached')), 0)
+
+    def test_breached_password_validator(self):
+        validator = BreachedPasswordValidator(path=self.tmpdir, min_count=20000)
+        self.assertRaises(ValidationError, validator.validate, 'password')
+        self.assertIsNone(validator.validate('hunter2'))
+
+    def test_missing_index_is_a_configuration_error(self):
+        validator = BreachedPasswordValidator(path=os.path.join(self.tmpdir, 'missing'))
+        self.assertRaises(ImproperlyConfigured, validator.validate, 'password')
+
+    def test_index_built_after_first_use_is_picked_up(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        index = BreachedHashIndex(directory)
+        self.assertEqual(index.count(sha1_hex(u'password')), 0)
+        build_index([(sha1_hex(u'password'), 5)], directory)
+        self.assertEqual(index.count(sha1_hex(u'password')), 5)
+
+    def test_shards_are_world_readable(self):
+        for name in os.listdir(self.tmpdir):
+            self.assertEqual(os.stat(os.path.join(self.tmpdir, name)).st_mode & 0o777, 0o644)
+
+
+class PasswordPipelineTest(SimpleTestCase):
+    """
+    Tests the cost ordered password validation pipeline.
+    """
+    class ExpensiveValidator(object):
+        cost = COST_KDF
+        calls = 0
+
+        def validate(self, password, user=None):
+            self.calls += 1
+
+    def test_cheap_failure_skips_expensive_validators(self):
+        expensive = self.ExpensiveValidator()
+        pipeline = PasswordPipeline([expensive, MinimumLengthValidator(min_length=8)])
+        self.assertRaises(ValidationError, pipeline.validate, 'short')
+        self.assertEqual(expensive.calls, 0)
+        pipeline.validate('long enough')
+        self.assertEqual(expensive.calls, 1)
+
+    def test_cost_bounds(self):
+        expensive = self.ExpensiveValidator()
+        pipeline = PasswordPipeline([expensive, MinimumLengthValidator(min_length=8)])
+        pipeline.validate('long enough', max_cost=COST_KDF - 1)
+        self.assertEqual(expensive.calls, 0)
+        pipeline.validate('short', min_cost=COST_KDF)
+        self.assertEqual(expensive.calls, 1)
+
+
+@override_settings(SESSION_ENGINE='userware.sessions.signed_cookies')
+class UserCreationFormTest(TestCase):
+    """
+    Tests password validation on signup.
+    """
+    def test_password_is_checked_against_email(self):
+        from userware.forms import UserCreationForm
+        form = UserCreationForm(data={
+            'username': 'jsmith',
+            'email': 'johnsmith@example.com',
+            'password1': 'johnsmith',
+            'password2': 'johnsmith',
+        })
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['password2'][0],
+                         "The password is too similar to your username or email address.")
+
+    def test_explicit_zero_min_length(self):
+        self.assertEqual(MinimumLengthValidator(min_length=0).get_min_length(), 0)
+        self.assertEqual(MinimumLengthValidator().get_min_length(), defs.USERWARE_PASSWORD_MIN_LENGTH)
+
+
+class SignedCookieSessionTest(TestCase):
+    """
+    Tests the stateless session engine and its generation based logout.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('jane', 'jane@example.com', 'secret')
+
+    def get_session_key(self):
+        store = SessionStore()
+        store[SESSION_KEY] = str(self.user.pk)
+        store[generations.GENERATION_SESSION_KEY] = generations.get_generation(self.user.pk)
+        store.save()
+        return store.session_key
+
+    def test_session_round_trip(self):
+        session_key = self.get_session_key()
+        self.assertEqual(SessionStore(session_key)[SESSION_KEY], str(self.user.pk))
+
+    def test_bumped_generation_logs_session_out(self):
+        session_key = self.get_session_key()
+        generations.bump_generation(self.user.pk)
+        self.assertNotIn(SESSION_KEY, SessionStore(session_key))
+
+
+class EventBusTest(SimpleTestCase):
+    """
+    Tests batched delivery of userware events.
+    """
+    def test_events_are_delivered_in_one_batch_per_request(self):
+        bus = EventBus()
+        batches, singles = [], []
+        bus.subscribe(batches.append, events=['login', 'logout'], batch=True)
+        bus.subscribe(singles.append, events=['login'])
+
+        bus.start_request()
+        bus.enqueue(Event('login'))
+        bus.enqueue(Event('logout'))
+        self.assertEqual(batches, [])
+        bus.finish_request()
+
+        self.assertEqual(len(batches), 1)
+        self.assertEqual([event.name for event in batches[0]], ['login', 'logout'])
+        self.assertEqual([event.name for event in singles], ['login'])
+
+    def test_events_outside_a_request_are_delivered_immediately(self):
+        bus = EventBus()
+        received = []
+        bus.subscribe(received.append)
+        bus.enqueue(Event('login'))
+        self.assertEqual(len(received), 1)
+
+    def test_skipped_finish_does_not_hold_events(self):
+        bus = EventBus()
+        received = []
+        bus.subscribe(received.append)
+        bus.start_request()
+        bus.enqueue(Event('login'))
+        bus.start_request()
+        self.assertEqual([event.name for event in received], ['login'])
+
+
+class BackgroundThreadTest(SimpleTestCase):
+    """
+    Tests the per process background thread.
+    """
+    def test_thread_is_started_once_per_process(self):
+        import threading
+
+        class Thread(BackgroundThread):
+            def setup(self):
+                self.done = threading.Event()
+                self.setups = getattr(self, 'setups', 0) + 1
+
+            def run(self):
+                self.done.set()
+
+        thread = Thread()
+        thread.ensure_running()
+        thread.ensure_running()
+        self.assertTrue(thread.done.wait(5))
+        self.assertEqual(thread.setups, 1)
+
+        # as seen from a forked child
+        thread.pid = -1
+        thread.ensure_running()
+        self.assertTrue(thread.done.wait(5))
+        self.assertEqual(thread.setups, 2)
+
+
+class EventTransactionTest(TransactionTestCase):
+    """
+    Tests that events follow the outcome of the surrounding transaction.
+    """
+    def setUp(self):
+        self.bus = EventBus()
+        self.received = []
+        self.bus.subscribe(self.received.append)
+
+    def test_events_are_dispatched_on_commit(self):
+        with transaction.atomic():
+            self.bus.publish('login')
+            self.assertEqual(self.received, [])
+        self.assertEqual([event.name for event in self.received], ['login'])
+
+    def test_events_are_dropped_on_rollback(self):
+        try:
+            with transaction.atomic():
+                self.bus.publish('login')
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(self.received, [])
+
+
+@override_settings(PASSWORD_HASHERS=[
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.SHA1PasswordHasher',
+])
+class HashUpgradeTest(TestCase):
+    """
+    Tests offline wrapping of legacy password hashes.
+    """
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='jane', email='jane@example.com')
+        self.user.password = make_password('secret', 'salt', 'sha1')
+        self.user.save()
+
+    def test_legacy_hash_is_wrapped_and_upgraded_on_login(self):
+        self.assertEqual(upgrade_hashes(0, self.user.pk + 1), 1)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_wrapped_sha1$'))
+
+        self.assertIsNone(ModelBackend().authenticate(username='jane', password='wrong'))
+        self.assertEqual(ModelBackend().authenticate(username='jane', password='secret'), self.user)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+    def test_unsalted_hashes_are_wrapped(self):
+        import hashlib
+        User = get_user_model()
+        sha1 = User.objects.create(username='sha1', email='sha1@example.com',
+                                   password='sha1$$' + hashlib.sha1(b'secret').hexdigest())
+        md5 = User.objects.create(username='md5', email='md5@example.com',
+                                  password=hashlib.md5(b'secret').hexdigest())
+        self.assertEqual(upgrade_hashes(0, md5.pk + 1), 3)
+        sha1.refresh_from_db()
+        md5.refresh_from_db()
+        self.assertTrue(sha1.password.startswith('pbkdf2_wrapped_unsalted_sha1$'))
+        self.assertTrue(md5.password.startswith('pbkdf2_wrapped_unsalted_md5$'))
+        self.assertEqual(ModelBackend().authenticate(username='sha1', password='secret'), sha1)
+        self.assertEqual(ModelBackend().authenticate(username='md5', password='secret'), md5)
+
+    def test_upgrade_is_idempotent(self):
+        upgrade_hashes(0, self.user.pk + 1)
+        self.assertEqual(upgrade_hashes(0, self.user.pk + 1), 0)
+
+
+class SwitchSearchTest(TestCase):
+    """
+    Tests the switch user type-ahead lookup.
+    """
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create(username='janet', email='janet@example.com')
+        User.objects.create(username='jane', email='doe@example.com')
+        User.objects.create(username='jango', email='jango@example.com', is_superuser=True)
+        User.objects.create(username='bob', email='jane.bob@example.com')
+
+    def test_prefix_search_excludes_superusers(self):
+        usernames = [user.username for user in util.search_switchable_users('jan')]
+        self.assertEqual(usernames, ['bob', 'jane', 'janet'])
+
+    def test_email_search_and_limit(self):
+        usernames = [user.username for user in util.search_switchable_users('jane.bob@')]
+        self.assertEqual(usernames, ['bob'])
+        self.assertEqual(len(util.search_switchable_users('j', limit=1)), 1)
+
+    def test_search_ignores_case(self):
+        get_user_model().objects.create(username='JohnDoe', email='JD@Example.com')
+        self.assertEqual([user.username for user in util.search_switchable_users('john')], ['JohnDoe'])
+        self.assertEqual([user.username for user in util.search_switchable_users('JOHN')], ['JohnDoe'])
+        self.assertEqual([user.username for user in util.search_switchable_users('jd@ex')], ['JohnDoe'])
+
+    def test_rate_limit(self):
+        cache.clear()
+        self.assertFalse(util.is_rate_limited('test', 2))
+        self.assertFalse(util.is_rate_limited('test', 2))
+        self.assertTrue(util.is_rate_limited('test', 2))
+
+
+class ArchiveTest(TestCase):
+    """
+    Tests archival and restore of disabled users.
+    """
+    def setUp(self):
+        User = get_user_model()
+        self.active = User.objects.create(username='active', email='active@example.com')
+        self.disabled = User.objects.create(username='gone', email='disabled-gone@example.com', is_active=False)
+
+    def test_delete_mode_moves_user_to_archive_and_back(self):
+        self.assertEqual(archive_users(get_archivable_users(), ArchivedUser.MODE_DELETE), 1)
+        self.assertFalse(get_user_model().objects.filter(pk=self.disabled.pk).exists())
+        self.assertIsNone(util.get_user_by_username_or_email('gone'))
+
+        user = restore_user(self.disabled.pk)
+        self.assertEqual(user.email, 'disabled-gone@example.com')
+        self.assertFalse(ArchivedUser.objects.exists())
+
+    def test_delete_mode_skips_referenced_users(self):
+        from django.contrib.auth.models import Group
+        self.disabled.groups.add(Group.objects.create(name='customers'))
+        ImpersonationLog.objects.create(staff=self.disabled, switched_username='active',
+                                        action=ImpersonationLog.ACTION_REQUEST)
+        self.assertEqual(archive_users(get_archivable_users(), ArchivedUser.MODE_DELETE), 0)
+        self.assertTrue(get_user_model().objects.filter(pk=self.disabled.pk).exists())
+
+        ImpersonationLog.objects.all().delete()
+        self.assertEqual(archive_users(get_archivable_users(), ArchivedUser.MODE_DELETE), 1)
+        self.assertEqual(list(restore_user(self.disabled.pk).groups.values_list('name', flat=True)),
+                         ['customers'])
+
+    def test_tombstone_mode_keeps_row_without_identity(self):
+        archive_users(get_archivable_users(), ArchivedUser.MODE_TOMBSTONE)
+        tombstone = get_user_model().objects.get(pk=self.disabled.pk)
+        self.assertEqual(tombstone.username, 'archived-{}'.format(self.disabled.pk))
+        self.assertFalse(tombstone.has_usable_password())
+        self.assertIsNone(util.get_user_by_username_or_email(tombstone.username))
+        self.assertEqual(get_archivable_users().count(), 0)
+
+        self.assertEqual(restore_user(self.disabled.pk).username, 'gone')
+
+    def test_archived_identity_is_not_reusable(self):
+        from userware.forms import UserCreationForm
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        archive_users(get_archivable_users(), ArchivedUser.MODE_TOMBSTONE)
+        form = UserCreationForm(data={'username': 'Gone', 'email': 'Disabled-Gone@example.com'})
+        form.is_valid()
+        self.assertIn('username', form.errors)
+        self.assertIn('email', form.errors)
+
+        get_user_model().objects.create(username='gone', email='new@example.com')
+        self.assertRaises(ValueError, restore_user, self.disabled.pk)
+        self.assertRaises(CommandError, call_command, 'userware_restore_users', 'gone')
+        self.assertTrue(ArchivedUser.objects.filter(user_id=self.disabled.pk).exists())
+
+    def test_archived_prefix_only_hides_tombstones(self):
+        User = get_user_model()
+        live = User.objects.create(username='archived-foo', email='archived-news@corp.com')
+        self.assertEqual(util.get_user_by_username_or_email('archived-foo'), live)
+        self.assertEqual(util.get_user_by_username_or_email('archived-news@corp.com'), live)
+
+        from userware.forms import UserCreationForm
+        form = UserCreationForm(data={'username': 'archived-bar'})
+        form.is_valid()
+        self.assertIn('username', form.errors)
+
+
+class IdempotencyTest(SimpleTestCase):
+    """
+    Tests replay of duplicate POSTs carrying the same idempotency key.
+    """
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def post(self, view, key, **data):
+        data['idempotency_key'] = key
+        request = RequestFactory().post('/delete', data)
+        request.user = AnonymousUser()
+        return view(request)
+
+    def test_duplicate_post_replays_first_redirect(self):
+        @idempotent
+        def view(request):
+            self.calls.append(request)
+            return HttpResponseRedirect('/done/{}'.format(len(self.calls)))
+
+        first = self.post(view, 'abc')
+        second = self.post(view, 'abc')
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(second.status_code, 302)
+        self.assertEqual(second['Location'], first['Location'])
+        self.post(view, 'xyz')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_non_redirect_releases_key(self):
+        @idempotent
+        def view(request):
+            self.calls.append(request)
+            return HttpResponse('form errors')
+
+        self.post(view, 'abc')
+        self.post(view, 'abc')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_same_key_with_different_data_is_rejected(self):
+        @idempotent
+        def view(request):
+            self.calls.append(request)
+            return HttpResponseRedirect('/done')
+
+        self.post(view, 'abc', email='jane@example.com', csrfmiddlewaretoken='one')
+        self.assertEqual(self.post(view, 'abc', email='jane@example.com', csrfmiddlewaretoken='two').status_code, 302)
+        self.assertEqual(self.post(view, 'abc', email='doe@example.com').status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+
+@override_settings(
+    USERWARE_USER_SNAPSHOT=True,
+    USERWARE_USER_SNAPSHOT_CACHE='snapshots',
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'snapshots': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(tempfile.gettempdir(), 'userware-test-snapshots'),
+        },
+    },
+)
+class UserSnapshotTest(TestCase):
+    """
+    Tests loading request.user from a session snapshot.
+    """
+    def setUp(self):
+        cache.clear()
+        snapshot.get_cache().clear()
+        self.user = get_user_model().objects.create(username='jane', email='jane@example.com')
+        self.request = RequestFactory().get('/')
+        self.request.session = DbSessionStore()
+        self.request.session[SESSION_KEY] = str(self.user.pk)
+        self.request.session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        self.request.session[HASH_SESSION_KEY] = self.user.get_session_auth_hash()
+
+    def test_snapshot_skips_user_query_until_user_is_saved(self):
+        self.assertEqual(snapshot.get_user(self.request), self.user)
+        with self.assertNumQueries(0):
+            user = snapshot.get_user(self.request)
+        self.assertEqual(user.username, 'jane')
+        self.assertTrue(user.is_authenticated())
+
+        self.user.email = 'doe@example.com'
+        self.user.save()
+        self.assertEqual(snapshot.get_user(self.request).email, 'doe@example.com')
+
+    def test_receivers_are_connected_on_startup(self):
+        snapshot.get_user(self.request)
+        self.user.delete()
+        self.assertIsNone(snapshot.load_snapshot(self.request.session[snapshot.SNAPSHOT_SESSION_KEY]))
+
+    def test_unrelated_save_keeps_snapshot(self):
+        snapshot.get_user(self.request)
+        self.user.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            snapshot.get_user(self.request)
+
+    @override_settings(USERWARE_USER_SNAPSHOT_CACHE='default')
+    def test_per_process_cache_is_rejected(self):
+        self.assertRaises(ImproperlyConfigured, snapshot.get_user, self.request)
+
+
+class LastLoginTest(TestCase):
+    """
+    Tests coalesced last_login writes.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create(username='jane', email='jane@example.com')
+
+    def test_flush_writes_latest_login(self):
+        lastlogin.record_last_login(None, self.user)
+        lastlogin.record_last_login(None, self.user)
+        self.assertEqual(lastlogin.flush_last_logins(), 1)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(lastlogin.flush_last_logins(), 0)
+
+    def test_entry_written_after_a_flush_is_not_skipped(self):
+        # numbered by a concurrent login, but not written yet
+        cache.add(lastlogin.SEQUENCE_KEY, 0, None)
+        number = cache.incr(lastlogin.SEQUENCE_KEY)
+        self.assertEqual(lastlogin.flush_last_logins(), 0)
+
+        login = timezone.now()
+        cache.set(lastlogin.get_entry_key(number), (self.user.pk, login))
+        self.assertEqual(lastlogin.flush_last_logins(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, login)
+
+    def test_flush_is_skipped_while_locked(self):
+        lastlogin.record_last_login(None, self.user)
+        cache.add(lastlogin.LOCK_KEY, 1)
+        self.assertEqual(lastlogin.flush_last_logins(), 0)
+        cache.delete(lastlogin.LOCK_KEY)
+        self.assertEqual(lastlogin.flush_last_logins(), 1)
+
+    def test_counter_reset_does_not_skip_entries(self):
+        lastlogin.record_last_login(None, self.user)
+        self.assertEqual(lastlogin.flush_last_logins(), 1)
+
+        # the counter is evicted, numbering starts over
+        cache.delete(lastlogin.SEQUENCE_KEY)
+        lastlogin.record_last_login(None, get_user_model().objects.create(username='john'))
+        self.assertEqual(lastlogin.flush_last_logins(), 1)
+
+        # the counter went back without a login noticing it
+        cache.set(lastlogin.FLUSHED_KEY, 10, None)
+        lastlogin.record_last_login(None, get_user_model().objects.create(username='jim'))
+        self.assertEqual(lastlogin.flush_last_logins(), 1)
+
+
+@override_settings(USERWARE_LOGIN_SHELL=True)
+class LoginShellTest(SimpleTestCase):
+    """
+    Tests when the login page may be served as a publicly cacheable shell.
+    """
+    def get_view(self, session_key=None):
+        from userware.views import UserLoginView
+        view = UserLoginView()
+        view.request = RequestFactory().get('/login')
+        view.request.session = SignedCookieStore(session_key)
+        return view
+
+    def test_untouched_session_allows_public_shell(self):
+        view = self.get_view()
+        self.assertTrue(view.use_shell(view.request))
+        self.assertTrue(view.session_is_untouched())
+
+    def test_modified_session_is_never_public(self):
+        view = self.get_view()
+        view.request.session['visited'] = True
+        self.assertFalse(view.session_is_untouched())
+        with self.settings(SESSION_SAVE_EVERY_REQUEST=True):
+            self.assertFalse(view.session_is_untouched())
+
+    def test_pending_messages_skip_the_shell(self):
+        view = self.get_view()
+        view.request._messages = ['You are logged out.']
+        self.assertFalse(view.use_shell(view.request))
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    """
+    Tests replica routing of userware lookups and read-your-writes pinning.
+    """
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.User = get_user_model()
+        replicas.reset()
+
+    def tearDown(self):
+        replicas.reset()
+
+    def test_only_userware_lookups_are_routed(self):
+        hints = {replicas.LOOKUP_HINT: True}
+        with self.settings(USERWARE_REPLICA_DATABASES=['replica']):
+            self.assertEqual(self.router.db_for_read(self.User, **hints), 'replica')
+            self.assertIsNone(self.router.db_for_read(self.User))
+            self.assertIsNone(self.router.db_for_read(ImpersonationLog, **hints))
+        self.assertIsNone(self.router.db_for_read(self.User, **hints))
+
+    def test_write_pins_to_primary_until_request_ends(self):
+        hints = {replicas.LOOKUP_HINT: True}
+        with self.settings(USERWARE_REPLICA_DATABASES=['replica']):
+            self.assertEqual(self.router.db_for_write(self.User), 'default')
+            self.assertEqual(self.router.db_for_read(self.User, **hints), 'default')
+            response = replicas.finish_request(HttpResponse())
+            self.assertIn(defs.USERWARE_REPLICA_PIN_COOKIE, response.cookies)
+            self.assertEqual(self.router.db_for_read(self.User, **hints), 'replica')
+
+    def test_pin_is_reset_without_the_middleware(self):
+        from django.core.signals import request_finished
+        replicas.pin_to_primary()
+        request_finished.send(sender=None)
+        self.assertFalse(replicas.is_pinned())
+
+
+class ProfileTest(TestCase):
+    """
+    Tests the per-request profile of the profiling middleware.
+    """
+    def test_queries_are_recorded_per_request(self):
+        from django.db import connection
+        queries_log = connection.queries_log
+        profile = _Profile(trace_memory=False)
+        profile.start()
+        get_user_model().objects.filter(username='jane').exists()
+        profile.stop()
+        self.assertEqual(len(profile.queries), 1)
+        self.assertEqual(profile.queries[0]['alias'], 'default')
+        self.assertIs(connection.queries_log, queries_log)
+
+    def test_only_one_profile_traces_memory(self):
+        from userware.middleware.profiling import tracemalloc
+        if tracemalloc is None:
+            return
+        first, second = _Profile(trace_memory=True), _Profile(trace_memory=True)
+        self.assertTrue(first.trace_memory)
+        self.assertFalse(second.trace_memory)
+        for profile in (first, second):
+            profile.start()
+            profile.stop()
+        self.assertIsNotNone(first.memory)
+        self.assertIsNone(second.memory)
+
+        third = _Profile(trace_memory=True)
+        self.assertTrue(third.trace_memory)
+        third.start()
+        third.stop()
+
+
+class ExportTest(TestCase):
+    """
+    Tests the streaming user export.
+    """
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create(username='jane', email='jane@example.com', first_name='=HYPERLINK("x")')
+        User.objects.create(username='john', email='john@example.com')
+
+    def export(self, *args):
+        from django.core.management import call_command
+        from django.utils.six import StringIO
+        out = StringIO()
+        call_command('userware_export_users', *args, stdout=out)
+        return out.getvalue()
+
+    def test_rows_are_read_in_keyset_batches(self):
+        rows = list(iter_rows(get_user_model().objects.all(), ['username'], chunk_size=1))
+        self.assertEqual(rows, [('jane',), ('john',)])
+
+    def test_csv_export_escapes_formulas(self):
+        lines = self.export('--fields', 'username,first_name').splitlines()
+        self.assertEqual(lines[0], 'username,first_name')
+        self.assertEqual(lines[1], 'jane,"\'=HYPERLINK(""x"")"')
+
+    def test_jsonl_export(self):
+        import json
+        lines = self.export('--format', 'jsonl', '--fields', 'username', '--filter', 'username=john').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{'username': 'john'}])
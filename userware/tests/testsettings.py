@@ -5,4 +5,10 @@ DATABASES = {
     },
 }
 SECRET_KEY = "un33k"
-INSTALLED_APPS = ['userware']
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.sites',
+    'userware',
+]
@@ -5,6 +5,7 @@ from django.contrib.auth import views as auth_views
 from .forms import UserPasswordResetForm
 from .forms import UserSetPasswordForm
 from . import utils as util
+from .idempotency import idempotent
 from .views import *
 
 urlpatterns = [
@@ -14,6 +15,11 @@ urlpatterns = [
         UserLoginView.as_view(),
         name='user_login'
     ),
+    url(
+        r'^login/state$',
+        UserLoginStateView.as_view(),
+        name='user_login_state'
+    ),
     url(
         r'^logout$',
         UserLogoutView.as_view(),
@@ -39,10 +45,20 @@ urlpatterns = [
         UserSwitchOnView.as_view(),
         name='user_switch_on'
     ),
+    url(
+        r'^switch/search$',
+        UserSwitchSearchView.as_view(),
+        name='user_switch_search'
+    ),
+    url(
+        r'^switch/off$',
+        UserSwitchOffView.as_view(),
+        name='user_switch_off'
+    ),
     # user forgot his/her password again. ask for username or email and send a reset link
     url(
         r'^password/reset/request$',
-        auth_views.password_reset,
+        idempotent(auth_views.password_reset),
         {
             'password_reset_form': UserPasswordResetForm,
             'template_name': util.get_template_path('password_reset_request_form.html'),
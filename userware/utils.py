@@ -1,30 +1,82 @@
 import os
+import time
 
 from django.contrib.auth import get_user_model
 from django.utils.html import simple_email_re
 from django.contrib import messages
+from django.contrib.auth import REDIRECT_FIELD_NAME
+from django.utils.http import is_safe_url
+from django.shortcuts import resolve_url
 
 from django.utils import timezone
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.core.cache import caches
 from datetime import datetime
 
-from . import defaults as defs
+from .conf import settings as defs
+from . import generations
+from . import replicas
+
+ARCHIVED_USERNAME_PREFIX = 'archived-'
 
 
 def get_user_by_username_or_email(username_or_email):
     """
-    Returns a user given an email or username.
+    Returns a user given an email or username. Archived users are never returned.
     """
     User = get_user_model()
     try:
         if simple_email_re.match(username_or_email):
-            user = User.objects.get(email__iexact=username_or_email)
+            user = replicas.get_user_manager().get(email__iexact=username_or_email)
         else:
-            user = User.objects.get(username__iexact=username_or_email)
+            user = replicas.get_user_manager().get(username__iexact=username_or_email)
     except User.DoesNotExist:
             return None
+    if is_archived_tombstone(user):
+        return None
     return user
 
 
+def is_archived_tombstone(user):
+    """
+    Returns True if `user` is the tombstone left behind by `userware.archive`.
+    """
+    username = '{}{}'.format(ARCHIVED_USERNAME_PREFIX, user.pk)
+    return user.username == username and not user.email and not user.has_usable_password()
+
+
+def search_switchable_users(term, limit=None):
+    """
+    Returns up to `limit` non-superusers whose username (or email) starts with `term`,
+    whatever its case. Prefixes are matched as `LIKE` on the lowercased columns, which
+    migration 0004 indexes on PostgreSQL (`text_pattern_ops`, so the collation doesn't matter).
+    """
+    limit = min(limit or defs.USERWARE_SWITCH_SEARCH_LIMIT, defs.USERWARE_SWITCH_SEARCH_LIMIT)
+    fields = ['email'] if '@' in term else ['username', 'email']
+    query = Q()
+    for field in fields:
+        query |= Q(**{field + '_lower__startswith': term.lower()})
+    users = replicas.get_user_manager().annotate(**dict((field + '_lower', Lower(field)) for field in fields))
+    users = users.filter(query, is_superuser=False)
+    return users.only('pk', 'username', 'email', 'first_name', 'last_name').order_by('username')[:limit]
+
+
+def is_rate_limited(key, rate, period=60):
+    """
+    Counts a hit on `key`, returns True once it exceeds `rate` hits in the current `period`.
+    """
+    cache = caches[defs.USERWARE_SWITCH_SEARCH_CACHE]
+    key = 'userware:ratelimit:{}:{}'.format(key, int(time.time() // period))
+    cache.add(key, 0, period)
+    try:
+        hits = cache.incr(key)
+    except ValueError:
+        # expired between add and incr
+        hits = 1
+    return hits > rate
+
+
 def get_template_path(name):
     """
     Given a template name, it returns the relative path from the template dir.
@@ -33,9 +85,34 @@ def get_template_path(name):
     return path
 
 
+def get_login_redirect_url(request, redirect_field_name=REDIRECT_FIELD_NAME):
+    """
+    Returns the (safe) url to redirect to after login.
+    """
+    redirect_to = request.GET.get(redirect_field_name, '')
+    if not is_safe_url(url=redirect_to, host=request.get_host()):
+        redirect_to = resolve_url(defs.LOGIN_REDIRECT_URL)
+    return redirect_to or None
+
+
 def has_pending_messages(request):
     """
     Given a request object it returns true if there are pending messages for session.
     """
     pending = len(messages.api.get_messages(request)) > 0
     return pending
+
+
+def force_logout(user, request=None):
+    """
+    Logs out all sessions of the user, except the one attached to `request` (if given).
+    With signed cookie sessions, this moves the user to a new session generation.
+    """
+    if not generations.is_enabled():
+        # imported here, auditware is only required for database backed sessions
+        from auditware.utils import force_logout as auditware_force_logout
+        auditware_force_logout(user, request)
+        return
+    generation = generations.bump_generation(user.pk)
+    if request is not None and request.user.pk == user.pk:
+        request.session[generations.GENERATION_SESSION_KEY] = generation
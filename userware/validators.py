@@ -0,0 +1,222 @@
+import os
+
+from django.core.exceptions import ValidationError
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.contrib.auth import password_validation
+from django.utils.encoding import force_text
+from django.utils.translation import ugettext as _
+
+from .sortedfile import open_sorted_file
+from .hashindex import BreachedHashIndex
+from .hashindex import sha1_hex
+from .conf import settings as defs
+
+# Estimated relative cost of a validator. Cheaper validators always run first,
+# anything at or above `COST_KDF` computes a password hash.
+COST_TRIVIAL = 1
+COST_LOOKUP = 10
+COST_KDF = 1000
+
+
+def blocklist_key(password):
+    """
+    Returns the normalized blocklist key of a password (stripped, lowercased, utf-8).
+    """
+    return force_text(password).strip().lower().encode('utf-8')
+
+
+class MinimumLengthValidator(object):
+    """
+    Validate whether the password is of a minimum length.
+    """
+    cost = COST_TRIVIAL
+
+    def __init__(self, min_length=None):
+        self.min_length = min_length
+
+    def get_min_length(self):
+        if self.min_length is None:
+            return defs.USERWARE_PASSWORD_MIN_LENGTH
+        return self.min_length
+
+    def validate(self, password, user=None):
+        min_length = self.get_min_length()
+        if len(password) < min_length:
+            raise ValidationError(
+                _("Password too short! minimum length is ") + " [%d]." % min_length,
+                code='password_too_short',
+            )
+
+    def get_help_text(self):
+        return _("Password must be minimum of %s characters." % self.get_min_length())
+
+
+class UserAttributeValidator(object):
+    """
+    Validate whether the password matches the username, the email address (or its local part)
+    or a reserved username.
+    """
+    cost = COST_TRIVIAL
+
+    def validate(self, password, user=None):
+        password = force_text(password).strip().lower()
+        if password in (name.lower() for name in defs.USERWARE_RESERVED_USERNAMES):
+            raise ValidationError(
+                _("This password is too common."),
+                code='password_too_common',
+            )
+        if user is None:
+            return
+        username = force_text(getattr(user, 'username', None) or '').lower()
+        email = force_text(getattr(user, 'email', None) or '').lower()
+        if password and password in (username, email, email.partition('@')[0]):
+            raise ValidationError(
+                _("The password is too similar to your username or email address."),
+                code='password_too_similar',
+            )
+
+    def get_help_text(self):
+        return _("Your password can't be your username or email address.")
+
+
+class CommonPasswordValidator(object):
+    """
+    Validate whether the password is a common password.
+
+    The blocklist is a sorted, fixed-width file built with `manage.py userware_build_blocklist`.
+    It is memory-mapped, so all worker processes share a single copy through the page cache.
+    """
+    cost = COST_LOOKUP
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def get_blocklist(self):
+        path = self.path or defs.USERWARE_PASSWORD_BLOCKLIST
+        if path:
+            return open_sorted_file(path)
+        return None
+
+    def validate(self, password, user=None):
+        blocklist = self.get_blocklist()
+        if blocklist is not None and blocklist_key(password) in blocklist:
+            raise ValidationError(
+                _("This password is too common."),
+                code='password_too_common',
+            )
+
+    def get_help_text(self):
+        return _("Your password can't be a commonly used password.")
+
+
+class BreachedPasswordValidator(object):
+    """
+    Validate whether the password appears in a known data breach.
+
+    Lookups are made against a local SHA-1 index built with
+    `manage.py userware_build_breached_index`; no network calls are made.
+    """
+    cost = COST_LOOKUP * 2
+    _indexes = {}
+
+    def __init__(self, path=None, min_count=1):
+        self.path = path
+        self.min_count = min_count
+
+    def get_index(self):
+        path = self.path or defs.USERWARE_PASSWORD_BREACHED_INDEX
+        if not path:
+            return None
+        if path not in self._indexes:
+            if not os.path.isdir(path):
+                raise ImproperlyConfigured(
+                    "The breached password index {} is not a directory, build it with "
+                    "`manage.py userware_build_breached_index`.".format(path))
+            self._indexes[path] = BreachedHashIndex(path)
+        return self._indexes[path]
+
+    def validate(self, password, user=None):
+        index = self.get_index()
+        if index is not None and index.count(sha1_hex(force_text(password))) >= self.min_count:
+            raise ValidationError(
+                _("This password has appeared in a data breach and can't be used."),
+                code='password_breached',
+            )
+
+    def get_help_text(self):
+        return _("Your password can't be one that has appeared in a known data breach.")
+
+
+class PasswordReuseValidator(object):
+    """
+    Validate whether the password differs from the user's current password.
+    This hashes the password, so it is only run once every cheaper validator has passed.
+    """
+    cost = COST_KDF
+
+    def validate(self, password, user=None):
+        if user is None or user.pk is None or not user.has_usable_password():
+            return
+        if user.check_password(password):
+            raise ValidationError(
+                _("New password is too similar to the old password. Please choose a different password."),
+                code='password_reused',
+            )
+
+    def get_help_text(self):
+        return _("Your password must differ from your current password.")
+
+
+class PasswordPipeline(object):
+    """
+    Runs validators from the cheapest to the most expensive (by their `cost` attribute),
+    stopping at the first failure, so an invalid password never pays for the expensive ones.
+    """
+    def __init__(self, validators):
+        self.validators = sorted(validators, key=lambda v: getattr(v, 'cost', COST_LOOKUP))
+
+    def validate(self, password, user=None, min_cost=0, max_cost=None):
+        """
+        Runs the validators whose cost falls within [min_cost, max_cost].
+        Raises the `ValidationError` of the first validator that fails.
+        """
+        for validator in self.validators:
+            cost = getattr(validator, 'cost', COST_LOOKUP)
+            if cost < min_cost:
+                continue
+            if max_cost is not None and cost > max_cost:
+                break
+            validator.validate(password, user)
+
+    def get_help_texts(self):
+        return [validator.get_help_text() for validator in self.validators]
+
+
+_pipeline = []
+
+
+def get_password_pipeline():
+    """
+    Returns the pipeline of the validators configured in `USERWARE_PASSWORD_VALIDATORS`.
+    """
+    if not _pipeline:
+        validators = password_validation.get_password_validators(defs.USERWARE_PASSWORD_VALIDATORS)
+        _pipeline.append(PasswordPipeline(validators))
+    return _pipeline[0]
+
+
+def validate_password(password, user=None, min_cost=0, max_cost=None):
+    """
+    Validates a password against the userware pipeline.
+    Raises `ValidationError` of the first (cheapest) failing validator.
+    """
+    get_password_pipeline().validate(password, user, min_cost=min_cost, max_cost=max_cost)
+
+
+def reset_password_pipeline(setting, **kwargs):
+    if setting == 'USERWARE_PASSWORD_VALIDATORS':
+        del _pipeline[:]
+
+
+setting_changed.connect(reset_password_pipeline, dispatch_uid='userware_reset_password_pipeline')
@@ -1,16 +1,24 @@
+from django.core.urlresolvers import reverse
 from django.core.urlresolvers import reverse_lazy
 from django.contrib import messages
 from django.utils.translation import ugettext_lazy as _
 from django.views.generic import TemplateView
 from django.views.generic import FormView
 from django.views.generic import DeleteView
+from django.views.generic import View
 from django.contrib.sites.shortcuts import get_current_site
 from django.contrib.auth import login as auth_login
 from django.contrib.auth import logout as auth_logout
 from django.contrib.auth import REDIRECT_FIELD_NAME
-from django.utils.http import is_safe_url
 from django.shortcuts import resolve_url
+from django.http import HttpResponse
 from django.http import HttpResponseRedirect
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.utils.cache import add_never_cache_headers
+from django.middleware.csrf import get_token
 from django.contrib.auth.forms import PasswordResetForm
 
 from toolware.utils.generic import get_uuid
@@ -20,18 +28,19 @@ from toolware.utils.mixin import CsrfProtectMixin
 from toolware.utils.mixin import NeverCacheMixin
 from toolware.utils.mixin import SensitivePostParametersMixin
 
-from auditware.utils import force_logout
-
 from .forms import UserPasswordChangeForm
 from .forms import UserAuthenticationForm
 from .forms import UserPasswordResetForm
 from .forms import UserDeletionForm
 from .forms import UserDisableForm
 from .forms import UserSwitchForm
-from .signals import user_switched_on
 
-from . import defaults as defs
+from .conf import settings as defs
+from .idempotency import IdempotentMixin
 from . import utils as util
+from . import replicas
+from . import events
+from . import snapshot
 
 
 class UserAccountView(LoginRequiredMixin, TemplateView):
@@ -49,9 +58,13 @@ class UserLogoutView(TemplateView):
     Logout and redirect to LOGOUT_REDIRECT_URL.
     """
     def get(self, request, *args, **kwargs):
-        if defs.USERWARE_SWTICHED_USER_KEY in request.session:
-            del request.session[defs.USERWARE_SWTICHED_USER_KEY]
+        switched_username = request.session.pop(defs.USERWARE_SWTICHED_USER_KEY, None)
+        request.session.pop(snapshot.SWITCHED_SNAPSHOT_SESSION_KEY, None)
+        if switched_username:
+            events.publish(events.SWITCHED_OFF, sender=getattr(request, 'original_user', request.user),
+                           request=request, switched_username=switched_username)
         if request.user.is_authenticated():
+            events.publish(events.LOGOUT, sender=request.user, request=request)
             auth_logout(request)
             messages.add_message(self.request, messages.SUCCESS, _('You are now logged out.'))
         return HttpResponseRedirect(defs.LOGOUT_REDIRECT_URL)
@@ -63,7 +76,6 @@ class UserLoginView(SensitivePostParametersMixin, CsrfProtectMixin,
     Login view.
     """
     form_class = UserAuthenticationForm
-    success_url = defs.LOGIN_REDIRECT_URL
     extra_context = {}
 
     redirect_field_name = REDIRECT_FIELD_NAME
@@ -73,10 +85,7 @@ class UserLoginView(SensitivePostParametersMixin, CsrfProtectMixin,
         return template_name
 
     def get_success_url(self):
-        redirect_to = self.request.GET.get(self.redirect_field_name, '')
-        if not is_safe_url(url=redirect_to, host=self.request.get_host()):
-            redirect_to = resolve_url(defs.LOGIN_REDIRECT_URL)
-        return redirect_to or None
+        return util.get_login_redirect_url(self.request, self.redirect_field_name)
 
     def get_form_kwargs(self):
         kwargs = super(UserLoginView, self).get_form_kwargs()
@@ -85,6 +94,7 @@ class UserLoginView(SensitivePostParametersMixin, CsrfProtectMixin,
 
     def form_valid(self, form):
         auth_login(self.request, form.get_user())
+        events.publish(events.LOGIN, sender=self.request.user, request=self.request)
         if self.request.session.test_cookie_worked():
             self.request.session.delete_test_cookie()
         messages.add_message(self.request, messages.SUCCESS,
@@ -110,14 +120,80 @@ class UserLoginView(SensitivePostParametersMixin, CsrfProtectMixin,
             return HttpResponseRedirect(defs.LOGIN_REDIRECT_URL)
         return super(UserLoginView, self).get(request, *args, **kwargs)
 
+    def dispatch(self, request, *args, **kwargs):
+        if self.use_shell(request):
+            return self.render_shell()
+        return super(UserLoginView, self).dispatch(request, *args, **kwargs)
+
+    def use_shell(self, request):
+        """
+        Returns True if the login page can be served as the static shell. Visitors with
+        pending messages (e.g. "logged out") get the regular page, which shows them.
+        """
+        if not defs.USERWARE_LOGIN_SHELL or request.method not in ('GET', 'HEAD'):
+            return False
+        return not util.has_pending_messages(request)
+
+    def session_is_untouched(self):
+        """
+        Returns True if SessionMiddleware won't set or delete the session cookie on this response.
+        """
+        session = getattr(self.request, 'session', None)
+        if session is None:
+            return True
+        empty = session.is_empty()
+        if settings.SESSION_COOKIE_NAME in self.request.COOKIES and empty:
+            return False
+        return not ((session.modified or settings.SESSION_SAVE_EVERY_REQUEST) and not empty)
+
+    def render_shell(self):
+        """
+        Renders the login page as a static shell, without touching the session, the user or
+        the csrf token, so it can be cached publicly (CDN, reverse proxy). The page fetches
+        the per-request bits from `UserLoginStateView`.
+        """
+        context = {
+            'redirect_field_name': self.redirect_field_name,
+            'login_state_url': reverse('userware:user_login_state'),
+        }
+        context.update(self.extra_context)
+        template_name = util.get_template_path("account_login_shell.html")
+        response = HttpResponse(render_to_string(template_name, context))
+        if not self.session_is_untouched():
+            # the response will carry this visitor's session cookie, it must not be shared.
+            add_never_cache_headers(response)
+            patch_cache_control(response, private=True)
+            return response
+        if hasattr(self.request, 'session'):
+            # middleware may have peeked at the session; the shell doesn't depend on it,
+            # so keep SessionMiddleware from adding `Vary: Cookie`.
+            self.request.session.accessed = False
+        patch_cache_control(response, public=True, max_age=defs.USERWARE_LOGIN_SHELL_MAX_AGE)
+        return response
+
+
+class UserLoginStateView(NeverCacheMixin, View):
+    """
+    Per-request state of the cacheable login page shell.
+    """
+    redirect_field_name = REDIRECT_FIELD_NAME
+
+    def get(self, request, *args, **kwargs):
+        request.session.set_test_cookie()
+        return JsonResponse({
+            'csrf_token': get_token(request),
+            'authenticated': request.user.is_authenticated(),
+            'redirect_field_name': self.redirect_field_name,
+            'redirect_to': util.get_login_redirect_url(request, self.redirect_field_name),
+        })
+
 
 class UserChangePassword(SensitivePostParametersMixin, CsrfProtectMixin,
-    LoginRequiredMixin, NeverCacheMixin, FormView):
+    LoginRequiredMixin, NeverCacheMixin, IdempotentMixin, FormView):
     """
     Change password for existing user.
     """
     form_class = UserPasswordChangeForm
-    success_url = defs.LOGIN_REDIRECT_URL
     message_text = {
         'success': _('Your password was changed.'),
         'warning': _('Changing your password will log you out of all of your other sessions.'),
@@ -127,6 +203,9 @@ class UserChangePassword(SensitivePostParametersMixin, CsrfProtectMixin,
         template_name = util.get_template_path("password_change_form.html")
         return template_name
 
+    def get_success_url(self):
+        return resolve_url(defs.LOGIN_REDIRECT_URL)
+
     def get_form_kwargs(self):
         kwargs = super(UserChangePassword, self).get_form_kwargs()
         kwargs['user'] = self.request.user
@@ -134,7 +213,8 @@ class UserChangePassword(SensitivePostParametersMixin, CsrfProtectMixin,
 
     def form_valid(self, form):
         form.save()
-        force_logout(self.request.user, self.request)
+        util.force_logout(self.request.user, self.request)
+        events.publish(events.PASSWORD_CHANGED, sender=self.request.user, request=self.request)
         messages.add_message(self.request, messages.SUCCESS, self.message_text['success'])
         return super(UserChangePassword, self).form_valid(form)
 
@@ -149,7 +229,7 @@ class UserChangePassword(SensitivePostParametersMixin, CsrfProtectMixin,
         return super(UserChangePassword, self).get(request, *args, **kwargs)
 
 
-class UserDeleteView(LoginRequiredMixin, CsrfProtectMixin, FormView):
+class UserDeleteView(LoginRequiredMixin, CsrfProtectMixin, IdempotentMixin, FormView):
     """
     Delete an account.
     """
@@ -169,6 +249,8 @@ class UserDeleteView(LoginRequiredMixin, CsrfProtectMixin, FormView):
     def form_valid(self, form):
         messages.add_message(self.request, messages.SUCCESS,
                 _("Account '%s' was permanently deleted. Sorry to see you go!" % self.request.user.username))
+        events.publish(events.DELETED, sender=self.request.user, request=self.request,
+                       user_id=self.request.user.pk, username=self.request.user.username)
         self.request.user.delete()
         return super(UserDeleteView, self).form_valid(form)
 
@@ -181,7 +263,7 @@ class UserDeleteView(LoginRequiredMixin, CsrfProtectMixin, FormView):
         return super(UserDeleteView, self).get(request, *args, **kwargs)
 
 
-class UserDisableView(LoginRequiredMixin, CsrfProtectMixin, FormView):
+class UserDisableView(LoginRequiredMixin, CsrfProtectMixin, IdempotentMixin, FormView):
     """
     Disable an account.
     """
@@ -206,6 +288,8 @@ class UserDisableView(LoginRequiredMixin, CsrfProtectMixin, FormView):
         self.request.user.set_password(password)
         self.request.user.email = '{}-{}'.format('disabled', self.request.user.email)
         self.request.user.save()
+        util.force_logout(self.request.user)
+        events.publish(events.DISABLED, sender=self.request.user, request=self.request)
         auth_logout(self.request)
         return super(UserDisableView, self).form_valid(form)
 
@@ -224,28 +308,69 @@ class UserSwitchOnView(LoginRequiredMixin, StaffRequiredMixin,
     Switch user id. AKA `su`.
     """
     form_class = UserSwitchForm
-    success_url = defs.LOGIN_REDIRECT_URL
 
     def get_template_names(self):
         template_name = util.get_template_path("account_switch_form.html")
         return template_name
 
+    def get_success_url(self):
+        return resolve_url(defs.LOGIN_REDIRECT_URL)
+
     def form_valid(self, form):
         switched_username = form.cleaned_data['switched_username']
         messages.add_message(self.request, messages.SUCCESS,
                             _("switched to user '%s'" % switched_username))
         self.request.session[defs.USERWARE_SWTICHED_USER_KEY] = switched_username
-        user_switched_on.send(sender=self.request.user, switched_username=form.cleaned_data['switched_username'])
+        replicas.pin_to_primary()
+        events.publish(events.SWITCHED_ON, sender=self.request.user, request=self.request,
+                       switched_username=switched_username)
         return super(UserSwitchOnView, self).form_valid(form)
 
+    def get_context_data(self, **kwargs):
+        context = super(UserSwitchOnView, self).get_context_data(**kwargs)
+        context['search_url'] = reverse('userware:user_switch_search')
+        return context
+
     def get(self, request, *args, **kwargs):
         avoid_duplicate_message = util.has_pending_messages(request)
         if not avoid_duplicate_message:
             messages.add_message(self.request, messages.WARNING,
-                    _("To switch back to a privileged user, you must re-login. This is done for security reasons."))
+                    _("To switch back to a privileged user, you must switch off or re-login."))
         return super(UserSwitchOnView, self).get(request, *args, **kwargs)
 
 
+class UserSwitchSearchView(LoginRequiredMixin, StaffRequiredMixin, NeverCacheMixin, View):
+    """
+    Type-ahead for the switch user form, `?q=<username or email prefix>`.
+    """
+    def get(self, request, *args, **kwargs):
+        if util.is_rate_limited('switch_search:{}'.format(request.user.pk), defs.USERWARE_SWITCH_SEARCH_RATE):
+            return JsonResponse({'error': 'Too many requests.'}, status=429)
+        term = request.GET.get('q', '').strip()
+        if len(term) < defs.USERWARE_SWITCH_SEARCH_MIN_LENGTH:
+            return JsonResponse({'results': []})
+        users = util.search_switchable_users(term[:254])
+        return JsonResponse({'results': [
+            {'username': user.username, 'email': user.email, 'name': user.get_full_name()}
+            for user in users
+        ]})
+
+
+class UserSwitchOffView(LoginRequiredMixin, TemplateView):
+    """
+    Switch back to the original (staff) user. AKA `exit`.
+    """
+    def get(self, request, *args, **kwargs):
+        switched_username = request.session.pop(defs.USERWARE_SWTICHED_USER_KEY, None)
+        request.session.pop(snapshot.SWITCHED_SNAPSHOT_SESSION_KEY, None)
+        if switched_username:
+            events.publish(events.SWITCHED_OFF, sender=getattr(request, 'original_user', request.user),
+                           request=request, switched_username=switched_username)
+            messages.add_message(self.request, messages.SUCCESS,
+                                _("switched off user '%s'" % switched_username))
+        return HttpResponseRedirect(defs.LOGIN_REDIRECT_URL)
+
+
 class UserRequestPasswordView(LoginRequiredMixin, TemplateView):
     """
     Authenticated socially can use this to request a password.